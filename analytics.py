@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+from orders_data import day_bounds, slice_days
+
+
+# Label the category selectbox uses for "no category filter"
+ALL_CATEGORIES = 'All Categories'
+
+
+# Start/end of each of the num_divisions periods of num_days ending at
+# anchor_end_ordinal. Range 0 is the selected period, range 1 the one before, ...
+def period_ranges(calendar, anchor_end_ordinal, num_days, num_divisions):
+    range_numbers = np.arange(num_divisions)
+    end_ordinals = anchor_end_ordinal - num_days * range_numbers
+    start_ordinals = end_ordinals - num_days + 1
+    return pd.DataFrame({
+        'Range_Number': range_numbers,
+        'Start_Ordinal': start_ordinals,
+        'End_Ordinal': end_ordinals,
+        'Start_Persian': calendar.to_persian(start_ordinals),
+        'End_Persian': calendar.to_persian(end_ordinals),
+    })
+
+
+# Orders of the optional category inside the whole window of periods, each with
+# its Range_Number = (anchor end ordinal - day ordinal) // num_days.
+# One binary-search slice and one vectorized pass, still ordered by Day_Ordinal.
+def bucket_periods(df_orders, anchor_end_ordinal, num_days, num_divisions, category=None):
+    window_start = anchor_end_ordinal - num_days * num_divisions + 1
+    window = slice_days(df_orders, window_start, anchor_end_ordinal)
+
+    # Apply category filter if necessary
+    if category is not None and category != ALL_CATEGORIES:
+        window = window[window['Category'] == category]
+
+    range_numbers = (anchor_end_ordinal - window['Day_Ordinal'].to_numpy()) // num_days
+    return window.assign(Range_Number=range_numbers.astype(np.int16))
+
+
+# Per-period sum of a measure and number of order rows, indexed by Range_Number
+def period_totals(bucketed, num_divisions, measure='Quantity'):
+    range_numbers = bucketed['Range_Number'].to_numpy()
+    values = bucketed[measure].to_numpy()
+    totals = np.bincount(range_numbers, weights=values, minlength=num_divisions)
+    if np.issubdtype(values.dtype, np.integer):
+        totals = totals.astype(np.int64)
+    rows = np.bincount(range_numbers, minlength=num_divisions)
+    return totals, rows
+
+
+# Periods of a period_ranges table that contain at least one order of df_orders
+def ranges_with_data(df_orders, ranges):
+    starts, ends = day_bounds(df_orders, ranges['Start_Ordinal'].to_numpy(), ranges['End_Ordinal'].to_numpy())
+    return ranges[ends > starts].reset_index(drop=True)
+
+
+# Wide ProductName x period table of a measure, built from the bucketed frame in
+# one grouped pass: one column per row of ranges (labelled 'start to end'), plus
+# Total/Max and the label of the period holding the max, computed on the array.
+# ranges must not be empty.
+def product_period_matrix(bucketed, ranges, measure='Quantity'):
+    labels, product_names, product_codes, columns, values = matrix_inputs(bucketed, ranges, measure)
+
+    # Scatter-add every row into its (product, period) cell
+    cells = np.bincount(product_codes * len(labels) + columns, weights=values,
+                        minlength=len(product_names) * len(labels))
+    matrix = cells.reshape(len(product_names), len(labels))
+    if np.issubdtype(values.dtype, np.integer):
+        matrix = matrix.astype(np.int64)
+    return matrix_frame(matrix, product_names, labels, measure)
+
+
+# Period labels, sorted product names, and per row its product code, period column and
+# measure value. Rows of periods not in ranges and rows without a product name are
+# left out, as groupby('ProductName') does.
+def matrix_inputs(bucketed, ranges, measure):
+    range_numbers = ranges['Range_Number'].to_numpy()
+    labels = [f'{start} to {end}' for start, end in zip(ranges['Start_Persian'], ranges['End_Persian'])]
+
+    # Column position of every row's period, -1 for periods not in ranges
+    columns = pd.Index(range_numbers).get_indexer(bucketed['Range_Number'].to_numpy())
+    keep = columns >= 0
+
+    product_codes, product_names = _product_codes(bucketed['ProductName'], keep)
+    values = bucketed[measure].to_numpy()[keep]
+    columns = columns[keep]
+
+    named = product_codes >= 0
+    return labels, product_names, product_codes[named], columns[named], values[named]
+
+
+# Codes of the kept rows' products in sorted name order, as pd.factorize(sort=True)
+# gives them. A categorical column (the cube's) is recoded from its category codes
+# instead of hashing every name.
+def _product_codes(names, keep):
+    if not isinstance(names.dtype, pd.CategoricalDtype):
+        return pd.factorize(names.to_numpy()[keep], sort=True)
+
+    category_codes = names.cat.codes.to_numpy()[keep]
+    present = np.flatnonzero(np.bincount(category_codes[category_codes >= 0], minlength=len(names.cat.categories)))
+    product_names = np.asarray(names.cat.categories[present], dtype=object)
+    order = np.argsort(product_names, kind='stable')
+    recode = np.full(len(names.cat.categories) + 1, -1, dtype=np.int64)
+    recode[present[order]] = np.arange(len(present))
+    return recode[category_codes], product_names[order]
+
+
+# The product x period array as the summary table
+def matrix_frame(matrix, product_names, labels, measure):
+    summary_df = pd.DataFrame(matrix, columns=labels)
+    summary_df.insert(0, 'ProductName', product_names)
+    summary_df[f'Total {measure}'] = matrix.sum(axis=1)
+    summary_df[f'Max {measure}'] = matrix.max(axis=1)
+    summary_df[f'Max {measure} Date Range'] = np.asarray(labels, dtype=object)[matrix.argmax(axis=1)]
+    return summary_df
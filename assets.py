@@ -0,0 +1,26 @@
+import os
+import threading
+
+
+# Static files of the page (stylesheet, logo) by path, with the (size, mtime) they
+# were read at. Shared by every rerun and session of the process.
+_assets = {}
+_assets_lock = threading.Lock()
+
+
+# Contents of a static file, read once per process and again only when it changes
+def asset_bytes(path):
+    key = os.path.abspath(path)
+    stat = os.stat(path)
+    stat = (stat.st_size, stat.st_mtime_ns)
+    with _assets_lock:
+        cached = _assets.get(key)
+        if cached is None or cached[0] != stat:
+            with open(path, 'rb') as f:
+                cached = (stat, f.read())
+            _assets[key] = cached
+        return cached[1]
+
+
+def asset_text(path, encoding='utf-8'):
+    return asset_bytes(path).decode(encoding)
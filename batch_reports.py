@@ -0,0 +1,113 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+from analytics import ALL_CATEGORIES
+from data_sources import open_source
+from engine import TrackingReport
+from persian_calendar import build_calendar
+
+
+# Batch mode: precompute the standard reports (the last 7/30/90 days for every
+# category) of the current dataset, so the dashboard serves them from disk.
+#
+#     python batch_reports.py --csv Orders.csv --out reports
+#
+# With ORDERS_DB / ORDERS_SQLITE set the reports are computed from the database.
+#
+# Reports live in <out>/<dataset version>/<report key>/ with a manifest.json listing
+# them; the dashboard only uses the directory of the version it has loaded.
+
+REPORTS_DIR = os.environ.get('ORDERS_REPORTS_DIR', 'reports')
+STANDARD_PERIODS = (7, 30, 90)
+STANDARD_DIVISIONS = (50,)
+
+# Name of a dataset version directory (versions are 128-bit hex digests)
+VERSION_DIR_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+# Directory name of a report (category names are Persian, so they are hashed)
+def report_key(num_days, num_divisions, category=None):
+    digest = hashlib.blake2b((category or ALL_CATEGORIES).encode('utf-8'), digest_size=6).hexdigest()
+    return f'{num_days}d_{num_divisions}x_{digest}'
+
+
+def precompute_reports(csv_path='Orders.csv', reports_dir=REPORTS_DIR, periods=STANDARD_PERIODS,
+                       divisions=STANDARD_DIVISIONS, progress=print):
+    source = open_source(csv_path)
+    version = source.version()
+    dates = source.dates()
+    calendar = build_calendar(dates)
+    end_ordinal = calendar.to_ordinal(dates[-1])
+    categories = [ALL_CATEGORIES] + source.categories()
+
+    # Written next to the final directory and swapped in once complete
+    target = os.path.join(reports_dir, version)
+    staging = target + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    manifest = {'version': version, 'end_ordinal': end_ordinal, 'reports': []}
+    started = time.perf_counter()
+    for num_days in periods:
+        for num_divisions in divisions:
+            for category in categories:
+                key = report_key(num_days, num_divisions, category)
+                report = source.report(calendar, end_ordinal - num_days + 1, end_ordinal, num_divisions, category)
+                report.save(os.path.join(staging, key))
+                manifest['reports'].append({'key': key, 'num_days': num_days,
+                                            'num_divisions': num_divisions, 'category': category})
+    with open(os.path.join(staging, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+
+    remove_stale_reports(reports_dir, version)
+
+    if progress:
+        progress(f"{len(manifest['reports'])} reports written to {target} in {time.perf_counter() - started:.1f}s")
+    return manifest
+
+
+# Reports of older versions can no longer be served, and staging directories left by
+# an interrupted run are dropped. Only directories this tool wrote are touched: a
+# version directory holding a manifest.json, or its .tmp staging directory.
+def remove_stale_reports(reports_dir, version):
+    for name in os.listdir(reports_dir):
+        path = os.path.join(reports_dir, name)
+        stem = name[:-len('.tmp')] if name.endswith('.tmp') else name
+        if name == version or not VERSION_DIR_PATTERN.fullmatch(stem) or not os.path.isdir(path):
+            continue
+        if name.endswith('.tmp') or os.path.exists(os.path.join(path, 'manifest.json')):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# The precomputed report for a selection, or None when the batch mode has not made one
+def find_report(version, start_ordinal, end_ordinal, num_divisions, category=None, reports_dir=REPORTS_DIR):
+    num_days = end_ordinal - start_ordinal + 1
+    path = os.path.join(reports_dir, version, report_key(num_days, num_divisions, category))
+    if not os.path.isdir(path):
+        return None
+    report = TrackingReport.load(path)
+    if (report.params['start_ordinal'], report.params['end_ordinal']) != (start_ordinal, end_ordinal):
+        return None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute the standard tracking reports')
+    parser.add_argument('--csv', default='Orders.csv')
+    parser.add_argument('--out', default=REPORTS_DIR)
+    parser.add_argument('--periods', type=int, nargs='+', default=list(STANDARD_PERIODS))
+    parser.add_argument('--divisions', type=int, nargs='+', default=list(STANDARD_DIVISIONS))
+    args = parser.parse_args()
+    precompute_reports(args.csv, args.out, args.periods, args.divisions)
+
+
+if __name__ == '__main__':
+    main()
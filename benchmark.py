@@ -0,0 +1,314 @@
+import argparse
+import ast
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import orders_data
+from analytics import bucket_periods, period_ranges, product_period_matrix, ranges_with_data
+from charts import daily_quantity_figure, payload_bytes
+from daily_cube import ORDER_ROWS, DailyCube
+from orders_data import load_orders, snapshot_path
+from parallel_matrix import product_period_matrix_parallel
+from persian_calendar import calendar_for_ordinals
+from synthetic_orders import generate_orders
+
+
+# Headless benchmark of the dashboard pipeline on synthetic exports: every stage the
+# Streamlit script runs, timed per dataset size and number of divisions, written as JSON
+# so runs of different releases can be compared.
+
+DEFAULT_ROWS = [100_000, 1_000_000]
+DEFAULT_DIVISIONS = [1, 10, 50, 100]
+
+# Startup budget of the dashboard in a new process: importing its modules, and the
+# first complete render of the page (with the data's snapshot already on disk)
+DASHBOARD_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'code_OrderTracking.py')
+IMPORT_BUDGET_S = 2.0
+FIRST_PAINT_BUDGET_S = 10.0
+
+
+@contextmanager
+def timed(samples, stage):
+    started = time.perf_counter()
+    yield
+    samples.setdefault(stage, []).append(time.perf_counter() - started)
+
+
+# Forget the in-process orders cache, so the next load_orders reads from disk again
+def drop_process_cache():
+    with orders_data._orders_lock:
+        orders_data._orders_cache.clear()
+
+
+# Loading stages: parsing the CSV, then restarting from the Parquet snapshot, then the cube
+def bench_load(csv_path, repeat):
+    samples = {}
+    df_orders = cube = None
+    for _ in range(repeat):
+        drop_process_cache()
+        if os.path.exists(snapshot_path(csv_path)):
+            os.remove(snapshot_path(csv_path))
+        with timed(samples, 'load_csv'):
+            load_orders(csv_path)
+
+        drop_process_cache()
+        with timed(samples, 'load_snapshot'):
+            df_orders = load_orders(csv_path)
+
+        with timed(samples, 'build_cube'):
+            cube = DailyCube(df_orders)
+    return samples, df_orders, cube
+
+
+# Per-rerun stages of the dashboard for one selection
+def bench_selection(cube, num_days, num_divisions, category, repeat):
+    samples = {}
+    info = {}
+    calendar = calendar_for_ordinals(cube.days)
+    end_ordinal = int(cube.days[-1])
+    start_ordinal = end_ordinal - num_days + 1
+
+    for _ in range(repeat):
+        with timed(samples, 'kpis'):
+            for measure in ('TotalPrice', 'Quantity', 'TotalNetPrice'):
+                cube.total(measure, start_ordinal, end_ordinal, category)
+                cube.total(measure, start_ordinal - num_days, end_ordinal - num_days, category)
+
+        with timed(samples, 'date_filter'):
+            ranges = period_ranges(calendar, end_ordinal, num_days, num_divisions)
+            bucketed = bucket_periods(cube.frame, end_ordinal, num_days, num_divisions, category)
+
+        with timed(samples, 'daily_series'):
+            window_start = end_ordinal - num_days * num_divisions + 1
+            in_window = (cube.days >= window_start) & (cube.days <= end_ordinal)
+            daily_quantity = pd.DataFrame({
+                'Date_Formatted': cube.dates,
+                'Quantity': np.where(in_window, cube.daily_at('Quantity', cube.days, category), 0),
+            })
+            has_orders = in_window & (cube.daily_at(ORDER_ROWS, cube.days, category) > 0)
+            combined_dates = set(cube.dates[has_orders])
+            line_dates = [end for end in ranges['End_Persian'] if end in combined_dates]
+
+        with timed(samples, 'product_matrix'):
+            filtered_ranges = ranges_with_data(cube.frame, ranges)
+            if not filtered_ranges.empty:
+                summary_df = product_period_matrix(bucketed, filtered_ranges, 'Quantity')
+                info['matrix_shape'] = list(summary_df.shape)
+
+        with timed(samples, 'figure'):
+            fig, info['chart_resolution'] = daily_quantity_figure(daily_quantity, line_dates, calendar)
+
+        with timed(samples, 'figure_json'):
+            info['figure_bytes'] = payload_bytes(fig)
+
+    info['bucketed_rows'] = len(bucketed)
+    return samples, info
+
+
+# Product matrix of one selection in the dashboard process and over process pools of
+# each size, with the speedup of every pool over the single-process build
+def bench_parallel_matrix(cube, num_days, num_divisions, category, workers_list, repeat):
+    samples = {}
+    calendar = calendar_for_ordinals(cube.days)
+    end_ordinal = int(cube.days[-1])
+    ranges = period_ranges(calendar, end_ordinal, num_days, num_divisions)
+    bucketed = bucket_periods(cube.frame, end_ordinal, num_days, num_divisions, category)
+    filtered_ranges = ranges_with_data(cube.frame, ranges)
+    if filtered_ranges.empty:
+        return samples, {}
+
+    expected = product_period_matrix(bucketed, filtered_ranges, 'Quantity')
+    for workers in workers_list:
+        # Start the pool outside the timings
+        product_period_matrix_parallel(bucketed, filtered_ranges, 'Quantity', workers)
+    for _ in range(repeat):
+        with timed(samples, 'product_matrix'):
+            product_period_matrix(bucketed, filtered_ranges, 'Quantity')
+        for workers in workers_list:
+            with timed(samples, f'product_matrix_{workers}_workers'):
+                table = product_period_matrix_parallel(bucketed, filtered_ranges, 'Quantity', workers)
+            if not table.equals(expected):
+                raise AssertionError(f'parallel matrix with {workers} workers differs')
+
+    single = statistics.median(samples['product_matrix'])
+    speedup = {workers: single / statistics.median(samples[f'product_matrix_{workers}_workers'])
+               for workers in workers_list}
+    return samples, {'bucketed_rows': len(bucketed), 'matrix_shape': list(expected.shape), 'speedup': speedup}
+
+
+# Modules a script imports at its top level
+def script_imports(script_path):
+    with open(script_path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+# Cold start of the dashboard, each sample in a fresh interpreter run from work_dir
+# (which holds Orders.csv and the page's static files): the import time of the
+# script's modules, and the time to the first complete render of the page
+def bench_startup(script_path, work_dir, repeat):
+    samples = {}
+    import_code = ('import time\nstarted = time.perf_counter()\n' +
+                   ''.join(f'import {module}\n' for module in script_imports(script_path)) +
+                   'print(time.perf_counter() - started)')
+    paint_code = ('import sys, time\nstarted = time.perf_counter()\n'
+                  'from streamlit.testing.v1 import AppTest\n'
+                  'app = AppTest.from_file(sys.argv[1], default_timeout=600)\napp.run()\n'
+                  'assert not app.exception, app.exception\nprint(time.perf_counter() - started)')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.dirname(script_path), os.environ.get('PYTHONPATH', '')]))
+
+    def measure(code, *args):
+        result = subprocess.run([sys.executable, '-c', code, *args], cwd=work_dir, env=env,
+                                capture_output=True, text=True, check=True)
+        return float(result.stdout.strip().splitlines()[-1])
+
+    # Write the snapshot and the bytecode caches first
+    measure(paint_code, script_path)
+    for _ in range(repeat):
+        samples.setdefault('import', []).append(measure(import_code))
+        samples.setdefault('first_paint', []).append(measure(paint_code, script_path))
+    return samples
+
+
+def run_startup(num_rows, num_products, num_days_span, repeat, csv_path=None, script_path=DASHBOARD_SCRIPT,
+                import_budget=IMPORT_BUDGET_S, paint_budget=FIRST_PAINT_BUDGET_S):
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, 'Orders.csv')
+        if csv_path is None:
+            generate_orders(path, num_rows, num_products, num_days_span, seed=0)
+        else:
+            shutil.copyfile(csv_path, path)
+        for asset in ('style.css', 'dgland_icon.png'):
+            shutil.copyfile(os.path.join(os.path.dirname(script_path), asset), os.path.join(work_dir, asset))
+        stages = summarize(bench_startup(script_path, work_dir, repeat))
+
+    budgets = {'import': import_budget, 'first_paint': paint_budget}
+    for stage, budget in budgets.items():
+        stages[stage]['budget_s'] = budget
+        stages[stage]['within_budget'] = stages[stage]['median_s'] <= budget
+        print(f"{stage:>12}  {stages[stage]['median_s']:.3f}s  (budget {budget:.1f}s)"
+              f"{'' if stages[stage]['within_budget'] else '  OVER BUDGET'}")
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'script': os.path.basename(script_path),
+        'dataset': {'rows': num_rows if csv_path is None else None, 'csv': csv_path},
+        'startup': stages,
+    }
+
+
+def summarize(samples):
+    return {stage: {'min_s': min(times), 'median_s': statistics.median(times), 'runs': len(times)}
+            for stage, times in samples.items()}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(rows_list, divisions_list, num_products, num_days_span, period_days, category, repeat, csv_path=None,
+        matrix_workers=()):
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for num_rows in rows_list:
+            # Work on a copy, so the real export's snapshot is left alone
+            path = os.path.join(work_dir, f'Orders_{num_rows}.csv')
+            if csv_path is None:
+                generate_orders(path, num_rows, num_products, num_days_span, seed=0)
+            else:
+                shutil.copyfile(csv_path, path)
+
+            load_samples, df_orders, cube = bench_load(path, repeat)
+            dataset = {'rows': len(df_orders), 'csv_bytes': os.path.getsize(path),
+                       'memory_bytes': int(df_orders.memory_usage(deep=True).sum()),
+                       'cube_cells': len(cube.frame), 'products': len(cube.products), 'days': len(cube.days)}
+            results.append({'dataset': dataset, 'stages': summarize(load_samples)})
+            print(f"{dataset['rows']:>12,} rows  load_csv {results[-1]['stages']['load_csv']['median_s']:.3f}s")
+
+            for num_divisions in divisions_list:
+                samples, info = bench_selection(cube, period_days, num_divisions, category, repeat)
+                results.append({'dataset': dataset, 'num_divisions': num_divisions, 'period_days': period_days,
+                                'category': category, **info, 'stages': summarize(samples)})
+                total = sum(stage['median_s'] for stage in results[-1]['stages'].values())
+                print(f"{dataset['rows']:>12,} rows  {num_divisions:>4} divisions  rerun {total:.3f}s")
+
+                if matrix_workers:
+                    samples, info = bench_parallel_matrix(cube, period_days, num_divisions, category,
+                                                          matrix_workers, repeat)
+                    results.append({'dataset': dataset, 'num_divisions': num_divisions, 'period_days': period_days,
+                                    'category': category, **info, 'stages': summarize(samples)})
+                    speedups = '  '.join(f'{workers}w x{speedup:.2f}' for workers, speedup in
+                                         info.get('speedup', {}).items())
+                    print(f"{dataset['rows']:>12,} rows  {num_divisions:>4} divisions  matrix {speedups}")
+
+            drop_process_cache()
+
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the order tracking pipeline on synthetic data')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--divisions', type=int, nargs='+', default=DEFAULT_DIVISIONS)
+    parser.add_argument('--products', type=int, default=5_000)
+    parser.add_argument('--days', type=int, default=730, help='span of the synthetic orders')
+    parser.add_argument('--period-days', type=int, default=7, help='length of one period (the selected range)')
+    parser.add_argument('--category', default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--csv', default=None, help='benchmark an existing Orders.csv instead of synthetic data')
+    parser.add_argument('--matrix-workers', type=int, nargs='*', default=[],
+                        help='also time the product matrix over process pools of these sizes')
+    parser.add_argument('--startup', action='store_true',
+                        help='time the cold start of the dashboard (imports, first render) instead')
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET_S)
+    parser.add_argument('--paint-budget', type=float, default=FIRST_PAINT_BUDGET_S)
+    parser.add_argument('--out', default='bench_results.json')
+    args = parser.parse_args()
+
+    if args.startup:
+        report = run_startup(args.rows[0], args.products, args.days, args.repeat, args.csv,
+                             import_budget=args.import_budget, paint_budget=args.paint_budget)
+    else:
+        report = run([0] if args.csv else args.rows, args.divisions, args.products, args.days,
+                     args.period_days, args.category, args.repeat, args.csv, args.matrix_workers)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f'Results written to {args.out}')
+
+    # A startup run over budget fails, so it can gate a release
+    if args.startup and not all(stage['within_budget'] for stage in report['startup'].values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
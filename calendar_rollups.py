@@ -0,0 +1,129 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from engine import growth_percent
+from trend_stats import persian_weekday
+
+
+# Persian calendar periods the daily series are rolled up to, next to the sliding
+# N-day periods of period_ranges
+GRANULARITIES = ('Week', 'Month', 'Quarter', 'Year')
+
+# Periods back of the same period a year earlier
+PERIODS_PER_YEAR = {'Week': 52, 'Month': 12, 'Quarter': 4, 'Year': 1}
+
+# Rollups per (source, dataset version, category, measure)
+_rollup_cache = {}
+_rollup_lock = threading.Lock()
+
+
+# Key of the period holding every day, consecutive for consecutive periods (weeks:
+# the number of the week starting Saturday; months, quarters: counted from year 0),
+# and the label of the period of every key
+def period_keys(calendar, ordinals, granularity):
+    ordinals = np.asarray(ordinals, dtype=np.int64)
+    if granularity == 'Week':
+        week_starts = ordinals - persian_weekday(ordinals)
+        return week_starts // 7, lambda keys: calendar.to_persian(np.asarray(keys) * 7 + week_starts[0] % 7)
+
+    attributes = calendar.attributes(ordinals, ('Persian_Year', 'Persian_Month'))
+    years = attributes['Persian_Year'].to_numpy().astype(np.int64)
+    months = attributes['Persian_Month'].to_numpy().astype(np.int64)
+    if granularity == 'Month':
+        return years * 12 + months - 1, lambda keys: [f'{key // 12:04}-{key % 12 + 1:02}' for key in keys]
+    if granularity == 'Quarter':
+        return years * 4 + (months - 1) // 3, lambda keys: [f'{key // 4:04}-Q{key % 4 + 1}' for key in keys]
+    if granularity == 'Year':
+        return years, lambda keys: [f'{key:04}' for key in keys]
+    raise ValueError(f'unknown granularity: {granularity}')
+
+
+# Sums of one dense daily series (one value per day from first_ordinal) per Persian
+# week, month, quarter and year, materialized once: one table per granularity with
+# the period's label, first and last day, days covered by the series and total.
+# Comparing a period with an earlier one is then two lookups by period key.
+class CalendarRollups:
+    def __init__(self, first_ordinal, values, calendar):
+        values = np.asarray(values)
+        cumsum = np.concatenate([[0], np.cumsum(values)])
+        ordinals = np.arange(first_ordinal, first_ordinal + len(values), dtype=np.int64)
+        self.first_ordinal = int(first_ordinal)
+        self.cumsum = cumsum
+        self.tables = {}
+        self.keys = {}
+        for granularity in GRANULARITIES:
+            if not len(values):
+                self.tables[granularity] = pd.DataFrame(columns=['Period', 'Start_Ordinal', 'End_Ordinal',
+                                                                 'Days', 'Total'])
+                self.keys[granularity] = pd.Index([], dtype=np.int64)
+                continue
+            keys, label = period_keys(calendar, ordinals, granularity)
+            starts = np.flatnonzero(np.diff(keys, prepend=keys[0] - 1))
+            ends = np.append(starts[1:], len(values))
+            self.keys[granularity] = pd.Index(keys[starts])
+            self.tables[granularity] = pd.DataFrame({
+                'Period': label(keys[starts]),
+                'Start_Ordinal': ordinals[starts],
+                'End_Ordinal': ordinals[ends - 1],
+                'Days': ends - starts,
+                'Total': cumsum[ends] - cumsum[starts],
+            })
+
+    # Row of the period holding a day, or of the period lag periods before it
+    # (None when the series has no such period)
+    def _row(self, granularity, ordinal, lag=0):
+        table = self.tables[granularity]
+        if table.empty or not table['Start_Ordinal'].iat[0] <= ordinal <= table['End_Ordinal'].iat[-1]:
+            return None
+        day_row = np.searchsorted(table['Start_Ordinal'].to_numpy(), int(ordinal), side='right') - 1
+        keys = self.keys[granularity]
+        row = keys.get_indexer([keys[day_row] - lag])[0]
+        return row if row >= 0 else None
+
+    def period(self, granularity, ordinal, lag=0):
+        row = self._row(granularity, ordinal, lag)
+        return None if row is None else self.tables[granularity].iloc[row]
+
+    # Total of the period holding a day (lag periods back), 0 for periods without data
+    def total(self, granularity, ordinal, lag=0):
+        row = self._row(granularity, ordinal, lag)
+        return 0 if row is None else self.tables[granularity]['Total'].iat[row]
+
+    # Sum of the series over [start_ordinal, end_ordinal] (within the series)
+    def _sum(self, start_ordinal, end_ordinal):
+        start, end = int(start_ordinal) - self.first_ordinal, int(end_ordinal) - self.first_ordinal + 1
+        return self.cumsum[end] - self.cumsum[start]
+
+    # Period to date: the period holding a day, up to that day, against as many
+    # first days of the period lag periods before it: (current, previous, growth
+    # percent). lag=1 is period over period, PERIODS_PER_YEAR[granularity] the same
+    # period a year earlier.
+    def compare(self, granularity, ordinal, lag=1):
+        current_period = self.period(granularity, ordinal)
+        if current_period is None:
+            return 0, 0, 0
+        current = self._sum(current_period['Start_Ordinal'], ordinal)
+        previous_period = self.period(granularity, ordinal, lag)
+        previous = 0
+        if previous_period is not None:
+            days = int(ordinal) - current_period['Start_Ordinal']
+            previous = self._sum(previous_period['Start_Ordinal'],
+                                 min(previous_period['Start_Ordinal'] + days, previous_period['End_Ordinal']))
+        return current, previous, growth_percent(current, previous)
+
+
+# Rollups of a source's daily series for a category and measure, built once per
+# dataset version; rollups of older versions are dropped with the first of a new one
+def calendar_rollups(source, version, calendar, category=None, measure='Quantity'):
+    key = (source.key, version, category, measure)
+    with _rollup_lock:
+        rollups = _rollup_cache.get(key)
+        if rollups is None:
+            first_ordinal, values = source.daily_values(category, measure)
+            rollups = CalendarRollups(first_ordinal, values, calendar)
+            for old_key in [old_key for old_key in _rollup_cache if old_key[0] == source.key and old_key[1] != version]:
+                del _rollup_cache[old_key]
+            _rollup_cache[key] = rollups
+        return rollups
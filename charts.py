@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from persian_calendar import SATURDAY
+
+
+# Most bars the daily quantity chart draws; longer spans are rolled up to weeks, then months
+CHART_POINT_BUDGET = int(os.environ.get('ORDERS_CHART_POINTS', '400'))
+
+# Bars get a text label with their value only up to this many
+LABEL_BUDGET = 60
+
+RESOLUTIONS = ('Day', 'Week', 'Month')
+
+
+# Bucket label of every Persian date at a resolution: the date itself, the date of
+# the Saturday starting its week, or its 'YYYY-MM' month
+def bucket_labels(dates, calendar, resolution):
+    dates = np.asarray(dates, dtype=object)
+    if resolution == 'Day':
+        return dates
+    if resolution == 'Month':
+        return np.array([date[:7] for date in dates], dtype=object)
+    ordinals = calendar.to_ordinal(dates).astype(np.int64)
+    # date.fromordinal(1) is a Monday, so weekday() == (ordinal - 1) % 7
+    week_starts = ordinals - ((ordinals - 1) % 7 - SATURDAY) % 7
+    return calendar.to_persian(week_starts)
+
+
+# Finest resolution at which the dates fit in point_budget bars
+def choose_resolution(dates, calendar, point_budget=CHART_POINT_BUDGET):
+    for resolution in RESOLUTIONS:
+        if len(pd.unique(bucket_labels(dates, calendar, resolution))) <= point_budget:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+# Daily values summed per bucket (the dates are sorted, so buckets keep their order)
+def rollup(daily, calendar, resolution, measure='Quantity'):
+    labels = bucket_labels(daily['Date_Formatted'], calendar, resolution)
+    rolled = pd.DataFrame({'Label': labels, measure: daily[measure].to_numpy()})
+    if resolution == 'Day':
+        return rolled
+    return rolled.groupby('Label', sort=False)[measure].sum().reset_index()
+
+
+# The daily quantity chart, built once: bars (rolled up above the point budget),
+# the linear trend, the average line and every period boundary in a single trace.
+# Lines use WebGL traces; plotly has no WebGL bar trace, but the bars are bounded by
+# the point budget.
+def daily_quantity_figure(daily, line_dates, calendar, point_budget=CHART_POINT_BUDGET, measure='Quantity'):
+    # plotly is imported on first use, so a new process renders the widgets and
+    # metrics above the charts before loading it
+    import plotly.graph_objects as go
+
+    resolution = choose_resolution(daily['Date_Formatted'], calendar, point_budget)
+    rolled = rollup(daily, calendar, resolution, measure)
+    labels = rolled['Label'].to_numpy(dtype=object)
+    values = rolled[measure].to_numpy()
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=labels, y=values, name=measure, marker_color='#636EFA',
+        texttemplate='%{y}' if len(values) <= LABEL_BUDGET else None, textposition='outside',
+    ))
+
+    # Linear trend over the bar positions
+    if len(values) > 1:
+        positions = np.arange(len(values))
+        trend = np.poly1d(np.polyfit(positions, values, 1))
+        fig.add_trace(go.Scattergl(x=labels, y=trend(positions), mode='lines',
+                                   line=dict(color='red', dash='dash'), name='Trend Line'))
+
+    # Period boundaries: one vertical segment per bucket holding a period end,
+    # separated by gaps, all in one trace
+    line_labels = pd.unique(bucket_labels(list(line_dates), calendar, resolution)) if len(line_dates) else []
+    if len(line_labels):
+        top = values.max() if len(values) else 1
+        x = [value for label in line_labels for value in (label, label, None)]
+        y = [value for _ in line_labels for value in (0, top, None)]
+        fig.add_trace(go.Scattergl(x=x, y=y, mode='lines', line=dict(color='red', width=1),
+                                   name='Period Boundaries', hoverinfo='skip'))
+
+    if len(values):
+        fig.add_hline(y=values.mean(), line_color='green', line_width=2, line_dash='dash',
+                      annotation_text='Average', annotation_position='top right')
+
+    fig.update_layout(
+        title=f'Total {measure} per {resolution} - All Date Ranges Combined',
+        xaxis_title=resolution if resolution != 'Day' else 'Date',
+        yaxis_title=measure,
+        plot_bgcolor='white',
+        xaxis=dict(type='category', categoryorder='array', categoryarray=labels),
+    )
+    return fig, resolution
+
+
+# Size of the figure JSON sent to the browser
+def payload_bytes(fig):
+    return len(fig.to_json())
+
+
+# Trend of a measure over the periods for one or more products (a period x product
+# table from ProductSeriesStore.compare), one line per product
+def product_trend_figure(series, measure='Quantity'):
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    single = len(series.columns) == 1
+    style = dict(line=dict(color='red', width=2), marker=dict(size=8, color='black')) if single else {}
+    for product in series.columns:
+        fig.add_trace(go.Scatter(x=series.index, y=series[product], mode='lines+markers',
+                                 name=product if not single else f'{measure} Trend', **style))
+
+    fig.update_layout(
+        title=f'{measure} Trend for {series.columns[0]}' if single else f'{measure} Trend by Product',
+        xaxis_title='Date Range',
+        yaxis_title=measure,
+        xaxis=dict(tickangle=-45),  # Rotate x-axis labels for better readability
+        plot_bgcolor='white'
+    )
+    return fig
+
+
+# Rolling mean and EWMA of the daily series (DailyStats) over the given Persian dates,
+# drawn over a day-resolution daily quantity chart
+def add_moving_averages(fig, stats, dates, calendar):
+    import plotly.graph_objects as go
+
+    dates = np.asarray(dates, dtype=object)
+    positions = stats.positions(calendar.to_ordinal(dates)) if len(dates) else np.array([], dtype=np.int64)
+    inside = (positions >= 0) & (positions < len(stats.values))
+    dates, positions = dates[inside], positions[inside]
+    fig.add_trace(go.Scattergl(x=dates, y=stats.rolling_mean()[positions], mode='lines',
+                               line=dict(color='orange'), name='Rolling Mean'))
+    fig.add_trace(go.Scattergl(x=dates, y=stats.ewm[positions], mode='lines',
+                               line=dict(color='purple'), name='EWMA'))
+    return fig
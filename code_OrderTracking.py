@@ -1,66 +1,65 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from PIL import Image
-from convertdate import persian
 from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import numpy as np
+import os
+from persian_calendar import to_day_ordinal
+from assets import asset_bytes, asset_text
+from batch_reports import REPORTS_DIR, find_report
+from calendar_rollups import GRANULARITIES, PERIODS_PER_YEAR, calendar_rollups
+from charts import add_moving_averages, daily_quantity_figure, payload_bytes, product_trend_figure
+from instrumentation import TRACE_FILE, TRACE_PANEL, Trace, show_trace_panel
+from refresher import get_refresher
+from report_export import EXPORT_FORMATS, export_file_name, export_stream, report_table
+from result_cache import report_cache
+from trend_stats import daily_stats
 
 
 
 # Page setting
 st.set_page_config(layout="wide")
 
-# Load custom CSS
-with open('style.css') as f:
-    st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+# Timing spans of this rerun (sidebar panel / JSONL export, see instrumentation.py)
+trace = Trace('order_tracking')
 
-# Display image
-image = Image.open('dgland_icon.png')
-st.image(image, width=100)  # Adjust width as needed
+# Load custom CSS (read once per process, see assets.py)
+st.markdown(f'<style>{asset_text("style.css")}</style>', unsafe_allow_html=True)
 
-# Load dataset
-df_orders = pd.read_csv('Orders.csv')
+# Display image (the PNG bytes go to the browser as they are, without decoding)
+st.image(asset_bytes('dgland_icon.png'), width=100)  # Adjust width as needed
 
-# Calculate metrics
-total_sales = df_orders['TotalPrice'].sum()
-formatted_total_sales = "{:,}".format(total_sales)
+# Orders source: the daily cube of Orders.csv (orders summed per day, category and
+# product, built once per version and shared by every rerun and session), or the
+# orders database when ORDERS_DB / ORDERS_SQLITE is set (see data_sources.py).
+# A background thread reloads it when the data changes and swaps in the new snapshot,
+# so reruns never wait for a reload (see refresher.py).
+trace.stage('load')
+snapshot = get_refresher('Orders.csv').snapshot()
+source = snapshot.source
+if hasattr(source, 'cube'):
+    trace.count(len(source.cube.frame))
 
-total_volume = df_orders['Quantity'].sum()
-formatted_total_volume = "{:,}".format(total_volume)
+# Version of the loaded data; results cached under an older one are dropped, and a
+# rerun still on a replaced snapshot does not store its results
+dataset_id = snapshot.version
+report_cache.advance(dataset_id, snapshot.sequence)
 
-total_net = df_orders['TotalNetPrice'].sum()
-formatted_total_net = "{:,}".format(total_net)
-
-# Clean up category data
-df_orders['Category'] = df_orders['Category'].replace('گوشی موبایل ', 'گوشی موبایل')
-categories = ['All Categories'] + df_orders['Category'].unique().tolist()
-
-# Formatting and cleaning date values
-df_orders['Date_Formatted'] = df_orders['Date_Formatted'].fillna('0000-00-00')
-df_orders = df_orders[df_orders['Date_Formatted'] != '0000-00-00']
-
-# Ensure date is a string format
-df_orders['Date_value'] = df_orders['Date_Formatted'].str.replace('-', '').astype(str)
-sorted_dates = sorted(df_orders['Date_Formatted'].unique())
+# Category and date cleanup already happened in load_orders
+categories = ['All Categories'] + snapshot.categories
+sorted_dates = snapshot.dates
 
 # temporary adjustments (selecting brands)
 # df_orders = df_orders[df_orders['ProductName'].str.contains('سامسونگ', na=False)]
 
-# Function to convert Persian date to Gregorian date
-def persian_to_gregorian(persian_date_str):
-    year, month, day = map(int, persian_date_str.split('-'))
-    gregorian_date = persian.to_gregorian(year, month, day)
-    return datetime(gregorian_date[0], gregorian_date[1], gregorian_date[2])
+# Persian calendar dimension covering the data span (built once per span)
+trace.stage('calendar')
+calendar = snapshot.calendar
 
-# Convert Persian dates to Gregorian
+# Convert the first and last Persian dates to Gregorian for the date widget
 sorted_dates_persian = sorted_dates
-sorted_dates_gregorian = [persian_to_gregorian(date) for date in sorted_dates_persian]
+sorted_dates_gregorian = [datetime.fromordinal(int(ordinal)) for ordinal in calendar.to_ordinal([sorted_dates_persian[0], sorted_dates_persian[-1]])]
 
 
 # Date range selection using calendar widget
+trace.stage('widgets')
 b1, b2 = st.columns(2)
 start_date, end_date = b1.date_input(
     "Select Date Range",
@@ -70,10 +69,9 @@ start_date, end_date = b1.date_input(
 )
 selected_category = b2.selectbox('Select Category', categories)
 
-# Convert Gregorian dates back to Persian format
+# Convert Gregorian dates back to Persian format (calendar lookup)
 def gregorian_to_persian(gregorian_date):
-    persian_date = persian.from_gregorian(gregorian_date.year, gregorian_date.month, gregorian_date.day)
-    return f'{persian_date[0]:04}-{persian_date[1]:02}-{persian_date[2]:02}'
+    return calendar.to_persian(to_day_ordinal(gregorian_date))
 
 # Convert the selected Gregorian dates back to Persian format
 start_date_persian = gregorian_to_persian(start_date)
@@ -90,30 +88,23 @@ previous_start_date_persian = gregorian_to_persian(previous_start_date)
 previous_end_date_persian = gregorian_to_persian(previous_end_date)
 
 
-# Filter DataFrame by current and previous date ranges
-current_filtered_df = df_orders[(df_orders['Date_Formatted'] >= start_date_persian) & (df_orders['Date_Formatted'] <= end_date_persian)]
-previous_filtered_df = df_orders[(df_orders['Date_Formatted'] >= previous_start_date_persian) & (df_orders['Date_Formatted'] <= previous_end_date_persian)]
-
-# Apply category filter if necessary
-if selected_category != 'All Categories':
-    current_filtered_df = current_filtered_df[current_filtered_df['Category'] == selected_category]
-    previous_filtered_df = previous_filtered_df[previous_filtered_df['Category'] == selected_category]
-
-# Calculate metrics for the current date range
-current_total_sales = current_filtered_df['TotalPrice'].sum()
-current_total_volume = current_filtered_df['Quantity'].sum()
-current_total_net = current_filtered_df['TotalNetPrice'].sum()
-
-# Calculate metrics for the previous date range
-previous_total_sales = previous_filtered_df['TotalPrice'].sum()
-previous_total_volume = previous_filtered_df['Quantity'].sum()
-previous_total_net = previous_filtered_df['TotalNetPrice'].sum()
+# Current date range as day ordinals
+current_range = (to_day_ordinal(start_date), to_day_ordinal(end_date))
 
+# Metrics of the current date range against the previous one (shared by every
+# session looking at the same range and category)
+trace.stage('kpis')
+comparison = report_cache.get_or_compute(
+    ('comparison', dataset_id, *current_range, selected_category),
+    lambda: source.comparison(*current_range, selected_category, calendar))
+current_total_sales = comparison.current['TotalPrice']
+current_total_volume = comparison.current['Quantity']
+current_total_net = comparison.current['TotalNetPrice']
 
 # Calculate growth percentages
-sales_growth = ((current_total_sales - previous_total_sales) / previous_total_sales) * 100 if previous_total_sales else 0
-volume_growth = ((current_total_volume - previous_total_volume) / previous_total_volume) * 100 if previous_total_volume else 0
-net_growth = ((current_total_net - previous_total_net) / previous_total_net) * 100 if previous_total_net else 0
+sales_growth = comparison.growth['TotalPrice']
+volume_growth = comparison.growth['Quantity']
+net_growth = comparison.growth['TotalNetPrice']
 
 # Formatting the metrics
 formatted_total_sales = "{:,}".format(current_total_sales)
@@ -148,255 +139,141 @@ def format_persian_date(date_str):
     return date_str
 
 
+# Month over month and year over year, month to date up to the end of the range:
+# lookups in the Persian calendar rollups of the category (see calendar_rollups.py)
+trace.stage('calendar_kpis')
+kpi_measures = {'Price': 'TotalPrice', 'Volume': 'Quantity', 'Net Price': 'TotalNetPrice'}
+rollups = {measure: calendar_rollups(source, dataset_id, calendar, selected_category, measure)
+           for measure in kpi_measures.values()}
+end_ordinal = to_day_ordinal(end_date)
+current_month = rollups['Quantity'].period('Month', end_ordinal)
+if current_month is not None:
+    year, month = current_month['Period'].split('-')
+    st.write(f'{persian_months[month]} {year} to date, against the previous month (MoM) and the same month last year (YoY)')
+    kpi_columns = iter(st.columns(2 * len(kpi_measures)))
+    for label, measure in kpi_measures.items():
+        for name, lag in (('MoM', 1), ('YoY', PERIODS_PER_YEAR['Month'])):
+            current, previous, growth = rollups[measure].compare('Month', end_ordinal, lag)
+            next(kpi_columns).metric(f'{label} {name}', "{:,}".format(round(current)), f"{growth:.2f}%")
 
-# Create a widget to adjust the number of divisions
-num_divisions = st.slider("Select Number of Divisions", min_value=1, max_value=100, value=50)
-
-# Create additional date ranges based on the selected number of divisions
-additional_ranges = []
-for i in range(0, num_divisions):
-    additional_start_date = start_date - timedelta(days=num_days * i)
-    additional_end_date = end_date - timedelta(days=num_days * i)
-    additional_ranges.append((additional_start_date, additional_end_date))
-
-# Convert additional date ranges to Persian format
-additional_ranges_persian = [(gregorian_to_persian(start), gregorian_to_persian(end)) for start, end in additional_ranges]
-
-# Display additional date ranges for verification
-st.write("Additional Date Ranges:")
 
 
-all_ranges_dfs = []
+# Create a widget to adjust the number of divisions
+num_divisions = st.slider("Select Number of Divisions", min_value=1, max_value=100, value=50)
 
-# Adding additional date range data
-for idx, (start, end) in enumerate(additional_ranges_persian):
-    additional_filtered_df = df_orders[(df_orders['Date_Formatted'] >= start) & (df_orders['Date_Formatted'] <= end)]
+# Page sizes of the product table
+PAGE_SIZES = [25, 50, 100]
 
-    # Apply category filter if necessary
-    if selected_category != 'All Categories':
-        additional_filtered_df = additional_filtered_df[additional_filtered_df['Category'] == selected_category]
-    additional_filtered_df['Range_Number'] = idx
+# Moving averages, per-range statistics and weekday seasonality of the daily quantity
+show_statistics = st.checkbox('Show trend statistics')
 
-    all_ranges_dfs.append(additional_filtered_df)
+# Totals per Persian week, month, quarter or year
+show_calendar_periods = st.checkbox('Show calendar periods')
 
+# Ranges, daily quantities, segment averages and the product table of this selection:
+# from the shared result cache, else from disk when the batch mode (batch_reports.py)
+# precomputed them, else computed from the source
+def load_report():
+    report = None
+    if os.path.isdir(REPORTS_DIR):
+        report = find_report(dataset_id, *current_range, num_divisions, selected_category)
+    if report is None:
+        report = source.report(calendar, *current_range, num_divisions, selected_category)
+    return report
 
-combined_df = pd.concat(all_ranges_dfs, ignore_index=True)
-combined_df_sorted = combined_df.sort_values(by='Date_Formatted')
+trace.stage('report')
+report = report_cache.get_or_compute(
+    ('report', dataset_id, *current_range, selected_category, num_divisions), load_report)
+trace.count(len(report.matrix.table) if report.matrix.table is not None else len(report.ranges))
 
-all_dates= sorted_dates 
-daily_quantity_combined = combined_df.groupby('Date_Formatted')['Quantity'].sum().reset_index()
+# Create additional date ranges based on the selected number of divisions
+additional_ranges_table = report.ranges
+additional_ranges_persian = list(zip(additional_ranges_table['Start_Persian'], additional_ranges_table['End_Persian']))
 
-# Reindex with all possible dates and fill missing values with 0
-daily_quantity_combined = daily_quantity_combined.set_index('Date_Formatted').reindex(all_dates, fill_value=0).reset_index()
+# Display additional date ranges for verification
+st.write("Additional Date Ranges:")
 
-# Rename the index column back to 'Date_Formatted'
-daily_quantity_combined.rename(columns={'index': 'Date_Formatted'}, inplace=True)
+# Daily quantity for all possible dates, 0 outside the window
+daily_quantity_combined = report.daily[['Date_Formatted', 'Quantity']]
 
+# Dates in the window that have orders of the selected category
+combined_dates = set(report.daily['Date_Formatted'][report.daily['Has_Orders']])
 
-# Create a single bar chart with all the data
-fig_combined = px.bar(daily_quantity_combined, x='Date_Formatted', y='Quantity', title='Total Quantity per Day - All Date Ranges Combined', color_discrete_sequence=['#636EFA'])
-fig_combined.update_xaxes(type='category')
 
+# Period boundaries that fall on a day with orders
+trace.stage('figure')
 line_positions = [end for start, end in additional_ranges_persian]
 
-line_pos = []
-for i in line_positions:
-  if i in combined_df['Date_Formatted'].unique():
-    line_pos.append(i)
-
-
-# Display the combined chart with the red lines
-  # Create the bar chart
-fig_combined = px.bar(
-    daily_quantity_combined,
-    x='Date_Formatted',
-    y='Quantity',
-    title='Total Quantity per Day - All Date Ranges Combined',
-    color_discrete_sequence=['#636EFA']
-)
-
-
-
-# Add red vertical lines at the start of each date range
-for line_date in line_pos:
-    print(line_date)
-    
-    # Add vertical line
-    fig_combined.add_vline(x=line_date, fillcolor='red')
-# Ensure the x-axis is categorical
-fig_combined.update_xaxes(type='category')
-
-
-
-# Calculate the average quantity for each segment between red lines
-total_quantities = []
-average_quantities = []
-
-# Loop through each segment between red lines
-for i, ii in additional_ranges_persian:
-    end_line = ii
-    start_line = i
-    print(f'{start_line} and {end_line}')
-
-    # Filter data between the start and end lines
-    segment_df = combined_df_sorted[(combined_df_sorted['Date_Formatted'] >= start_line) & 
-                                    (combined_df_sorted['Date_Formatted'] <= end_line)]
-
-
-    if not segment_df.empty:
-        # Calculate th-e average quantity for this segment
-        tot_quantity = segment_df['Quantity'].sum()
-        avg_quantity = tot_quantity / num_days
-        total_quantities.append((end_line, tot_quantity))
-        average_quantities.append((end_line, round(avg_quantity)))
+line_pos = [i for i in line_positions if i in combined_dates]
 
+# Build the combined chart once: bars rolled up to weeks/months above the point
+# budget, the trend and average lines, and the red period boundaries
+fig_combined, chart_resolution = daily_quantity_figure(daily_quantity_combined, line_pos, calendar)
+trace.count(len(fig_combined.data[0].x))
 
-# Handle the final segment after the last red line
-#if len(line_positions) > 0:
-#    final_segment_df = combined_df_sorted[combined_df_sorted['Date_Formatted'] >= line_positions[-1]]
-#    if not final_segment_df.empty:
-#        tot_quantity = final_segment_df['Quantity'].sum()
-#        total_quantities.append((final_segment_df['Date_Formatted'].max(), tot_quantity))
-        
-# Add a trace for the trend line
-trend_line_dates = [date for date,_ in average_quantities]
-trend_line_values = [quantity for _, quantity in average_quantities]
+# Rolling mean and EWMA over the days of the window (cached statistics of the
+# whole daily series, brought up to date as new days arrive)
+if show_statistics:
+    trace.stage('statistics')
+    quantity_stats = daily_stats(source, selected_category)
+    window_start_persian = additional_ranges_table['Start_Persian'].iat[-1]
+    window_dates = [date for date in sorted_dates if window_start_persian <= date <= end_date_persian]
+    if chart_resolution == 'Day':
+        add_moving_averages(fig_combined, quantity_stats, window_dates, calendar)
 
-
-fig_combined.add_trace(
-    go.Scatter(x=[date for date in trend_line_dates],
-               y=trend_line_values,
-               mode='lines+markers',
-               line=dict(color='red', dash='dash'),
-               name='Total Trend')
-)
-
-# Create a single bar chart with all the data
-fig_combined = px.bar(
-    daily_quantity_combined,
-    x='Date_Formatted',
-    y='Quantity',
-    title='Total Quantity per Day - All Date Ranges Combined',
-    color_discrete_sequence=['#636EFA']
-)
-
-# Calculate the average quantity
-median_quantity = daily_quantity_combined['Quantity'].median()
-
-# Add a green horizontal line for the average quantity
-#fig_combined.add_hline(y=average_quantity, line_color='green', line_width=2, line_dash='dash', annotation_text="Median", annotation_position="top right")
-
-# Add data labels on top of each bar
-fig_combined.update_traces(texttemplate='%{y}', textposition='outside')
-
-# Update layout to ensure proper display
-fig_combined.update_layout(
-    xaxis_title='Date',
-    yaxis_title='Quantity',
-    plot_bgcolor='white',
-    xaxis=dict(type='category')
-# Rotate x-axis labels for better readability
-)
-
-# Convert categorical date to numeric index for trend line calculation
-numeric_dates = np.arange(len(daily_quantity_combined))
-
-# Calculate trend line (linear regression)
-z = np.polyfit(numeric_dates, daily_quantity_combined['Quantity'], 1)
-p = np.poly1d(z)
-
-# Add trend line to the plot
-fig_combined.add_trace(
-    go.Scatter(
-        x=daily_quantity_combined['Date_Formatted'],
-        y=p(numeric_dates),
-        mode='lines',
-        line=dict(color='red', dash='dash'),
-        name='Trend Line'
-    )
-)
-
-# Calculate the average quantity
-average_quantity = daily_quantity_combined['Quantity'].mean()
-
-# Add a green horizontal line for the average quantity
-fig_combined.add_hline(y=average_quantity, line_color='green', line_width=2, line_dash='dash', annotation_text="Average", annotation_position="top right")
-
-# Add data labels on top of each bar with valid textposition
-fig_combined.update_traces(texttemplate='%{y}', textposition='outside', selector=dict(type='bar'))
-
-# Update layout to ensure proper display
-fig_combined.update_layout(
-    xaxis_title='Date',
-    yaxis_title='Quantity',
-    plot_bgcolor='white',
-    xaxis=dict(type='category')
-)
+if TRACE_PANEL or TRACE_FILE:
+    trace.labels['chart'] = {'resolution': chart_resolution, 'payload_bytes': payload_bytes(fig_combined)}
 
 
 
 # Display the combined chart
+trace.stage('render_chart')
 st.plotly_chart(fig_combined)
 
+if show_statistics:
+    st.write("Quantity Statistics for Each Date Range")
+    st.write(quantity_stats.period_stats(additional_ranges_table))
+    st.write("Quantity by Day of Week")
+    st.write(quantity_stats.weekday_profile(to_day_ordinal(start_date) - num_days * (num_divisions - 1), to_day_ordinal(end_date)))
 
+if show_calendar_periods:
+    granularity = st.selectbox('Calendar Period', GRANULARITIES, index=GRANULARITIES.index('Month'))
+    periods = rollups['Quantity'].tables[granularity][['Period', 'Days']].copy()
+    for label, measure in kpi_measures.items():
+        periods[measure] = rollups[measure].tables[granularity]['Total'].to_numpy()
+    st.write(f"Totals per {granularity}")
+    st.dataframe(periods.iloc[::-1], hide_index=True)
 
 
 
 
 
-product_quantities_by_range = []
 
-# Filter the date ranges to include only those that have data in df_orders
-filtered_additional_ranges_persian = []
-for start, end in additional_ranges_persian:
-    if df_orders[(df_orders['Date_Formatted'] >= start) & (df_orders['Date_Formatted'] <= end)].shape[0] > 0:
-        filtered_additional_ranges_persian.append((start, end))
 
-# Iterate over the filtered date ranges and calculate quantities
-for idx, (start, end) in enumerate(filtered_additional_ranges_persian):
-    # Filter the DataFrame for the current date range
-    additional_filtered_df = df_orders[(df_orders['Date_Formatted'] >= start) & (df_orders['Date_Formatted'] <= end)]
-
-    # Apply category filter if necessary
-    if selected_category != 'All Categories':
-        additional_filtered_df = additional_filtered_df[additional_filtered_df['Category'] == selected_category]
-    
-    # Group by Product Name and sum the quantities
-    product_quantities = additional_filtered_df.groupby('ProductName')['Quantity'].sum().reset_index()
-    
-    # Add a column for the date range as the column name
-    product_quantities[f'{start} to {end}'] = product_quantities['Quantity']
-    
-    # Keep only the necessary columns
-    product_quantities = product_quantities[['ProductName', f'{start} to {end}']]
-    
-    # Append the result to the list
-    product_quantities_by_range.append(product_quantities)
-
-# Combine all the results into a single DataFrame by merging on ProductName
-if product_quantities_by_range:
-    summary_df = product_quantities_by_range[0]
-    for df in product_quantities_by_range[1:]:
-        summary_df = pd.merge(summary_df, df, on='ProductName', how='outer')
-
-    # Fill NaN values with 0 (if a product has no sales in a date range)
-    summary_df.fillna(0, inplace=True)
-
-    # Calculate the total quantity across all date ranges for sorting (optional)
-    summary_df['Total Quantity'] = summary_df.drop('ProductName', axis=1).sum(axis=1)
-    
-    # Calculate the maximum quantity and the corresponding date range
-    summary_df['Max Quantity'] = summary_df.drop(['ProductName', 'Total Quantity'], axis=1).max(axis=1)
-    summary_df['Max Quantity Date Range'] = summary_df.drop(['ProductName', 'Total Quantity', 'Max Quantity'], axis=1).idxmax(axis=1)
-    
-    # Sort the DataFrame by Total Quantity (optional)
-    summary_df = summary_df.sort_values(by='Total Quantity', ascending=False)
-
-    # Display the summary table
+# Product matrix over the date ranges that have orders (see engine.py)
+trace.stage('product_matrix')
+store = report.matrix.store
+if store is not None:
+    # Product x date range quantities (with Total/Max columns); products without
+    # sales in a range get 0. Searched, ranked and paged on the server: only the
+    # rows of the visible page are sent to the browser.
+    trace.count(len(store))
     st.write("Total Quantity by Product for Each Date Range")
-    st.write(summary_df)
-    count_products = summary_df.shape[0]
+    t1, t2, t3, t4 = st.columns(4)
+    product_query = t1.text_input('Search Products')
+    rank_by = t2.selectbox('Sort By', ['Total', 'Max', 'Growth'])
+    page_size = t3.selectbox('Rows per Page', PAGE_SIZES)
+    matching_codes = store.search(product_query)
+    page_count = max(1, -(-len(matching_codes) // page_size))
+    page = t4.number_input('Page', min_value=1, max_value=page_count, value=1)
+
+    # Top page * page_size of the matches (partial sort), of which the last page is shown
+    page_codes = store.ranked(rank_by, page * page_size, matching_codes)[(page - 1) * page_size:]
+    st.dataframe(store.rows(page_codes))
+    count_products = len(store)
     st.write(f'Total items: {count_products}')
+    if product_query:
+        st.write(f'Matching items: {len(matching_codes)} (page {page} of {page_count})')
 else:
     st.write("No valid date ranges with data found.")
 
@@ -404,52 +281,42 @@ else:
 
 
 
-# Assuming summary_df is already created and contains the necessary data
-
-# Create a list of distinct product names from the summary_df
-product_names = summary_df['ProductName'].unique()
-
-# Widget for selecting a product
-selected_product = st.selectbox('Select Product', product_names)
-
-# Function to get trend data for the selected product
-def get_trend_data(product_name, summary_df):
-    # Filter the summary_df for the selected product
-    product_data = summary_df[summary_df['ProductName'] == product_name]
-    
-    # Extract the date ranges and quantities
-    date_ranges = product_data.columns[1:-2]  # Exclude ProductName, Total Quantity, Max Quantity, Max Quantity Date Range
-    quantities = product_data.iloc[0, 1:-3]  # Get the quantities for the selected product
-    
-    return date_ranges, quantities
-
-# Get trend data for the selected product
-date_ranges, quantities = get_trend_data(selected_product, summary_df)
-
-
-# Create the trend line chart
-fig_trend = go.Figure()
-
-# Add trace for the trend line
-fig_trend.add_trace(
-    go.Scatter(
-        x=date_ranges,
-        y=quantities,
-        mode='lines+markers',
-        line=dict(color='red', width=2),
-        marker=dict(size=8, color='black'),
-        name='Quantity Trend'
-    )
-)
-
-# Update layout of the chart
-fig_trend.update_layout(
-    title=f'Quantity Trend for {selected_product}',
-    xaxis_title='Date Range',
-    yaxis_title='Quantity',
-    xaxis=dict(tickangle=-45),  # Rotate x-axis labels for better readability
-    plot_bgcolor='white'
-)
-
-# Display the trend line chart
-st.plotly_chart(fig_trend)
+# Trend of the selected products over the date ranges, read from the per-product
+# series of the product table (no rescan of summary_df per product)
+trace.stage('product_trend')
+if store is not None:
+    # Products of the visible page, in the order of the table above
+    product_names = store.products[page_codes]
+
+    # Widgets for selecting products, or the top sellers of the selection
+    p1, p2 = st.columns(2)
+    selected_products = p1.multiselect('Select Products', product_names, default=list(product_names[:1]))
+    top_count = p2.number_input('Or compare the top N products', min_value=0, max_value=20, value=0)
+    if top_count:
+        selected_products = store.top(top_count)
+
+    # Display the trend line chart
+    if selected_products:
+        fig_trend = product_trend_figure(store.compare(selected_products))
+        st.plotly_chart(fig_trend)
+
+# Downloads of the report's tables, converted in chunks straight from the cached
+# report when the button is clicked (on a thread of its own, not in this rerun)
+trace.stage('export')
+export_tables = {'Period KPIs': 'kpis', 'Period Totals': 'periods', 'Daily Quantities': 'daily'}
+if store is not None:
+    export_tables['Product Matrix'] = 'matrix'
+e1, e2, e3 = st.columns(3)
+export_table = export_tables[e1.selectbox('Export Table', list(export_tables))]
+export_format = e2.selectbox('Export Format', list(EXPORT_FORMATS))
+e3.download_button('Download', lambda: export_stream(report_table(report, export_table), export_format),
+                   file_name=export_file_name(export_table, export_format),
+                   mime=EXPORT_FORMATS[export_format][1])
+trace.finish()
+trace.labels['report_cache'] = report_cache.stats()
+trace.labels['snapshot'] = snapshot.to_dict()
+
+# Breakdown of this rerun, and the trace for offline analysis
+if TRACE_PANEL:
+    show_trace_panel(trace)
+trace.export()
@@ -0,0 +1,243 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from analytics import ALL_CATEGORIES
+from dimensions import rules_version
+from orders_data import STREAM_CHUNK_ROWS, file_stat, load_derived, print_progress, stream_orders
+from persian_calendar import calendar_for_ordinals
+
+
+# Measures summed into the cube; Order_Rows counts the order lines behind each cell
+MEASURES = ('Quantity', 'TotalPrice', 'TotalNetPrice')
+ORDER_ROWS = 'Order_Rows'
+CELL_KEYS = ['Day_Ordinal', 'Category_Code', 'Product_Code']
+CELL_COLUMNS = CELL_KEYS + list(MEASURES) + [ORDER_ROWS]
+
+# Partial cells a streamed build may hold before they are regrouped
+STREAM_COMPACT_CELLS = 2_000_000
+
+# Cubes built by streaming, cached per CSV path with the stat they were built from
+_streamed_cubes = {}
+_streamed_lock = threading.Lock()
+
+
+# Codes of values against an existing index, appending the values it does not have yet.
+# Missing values get the code -1.
+def _encode_values(values, index):
+    codes = index.get_indexer(values)
+    unseen = (codes < 0) & pd.notna(values)
+    if unseen.any():
+        index = index.append(pd.Index(pd.unique(values[unseen])))
+        codes = index.get_indexer(values)
+    return codes, index
+
+
+# Same for a column; categorical columns only have their lookup table re-coded
+def _encode(column, index):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        category_codes, index = _encode_values(column.cat.categories.to_numpy(), index)
+        codes = column.cat.codes.to_numpy()
+        return np.where(codes >= 0, category_codes[codes], -1), index
+    return _encode_values(column.to_numpy(), index)
+
+
+# Measure values widened to 64 bits so sums over compact columns cannot overflow
+def _widened(column):
+    values = column.to_numpy()
+    return values.astype(np.int64 if np.issubdtype(values.dtype, np.integer) else np.float64)
+
+
+# Daily cube: the orders summed per (day, category, product), built once per dataset.
+#   frame   - one row per non-empty (Day_Ordinal, Category, ProductName) cell, sorted by
+#             Day_Ordinal, so bucket_periods / product_period_matrix accept it like orders
+#   daily   - dense per-category day arrays for every measure (row per category, then
+#             one for orders without a category, then the all-categories row)
+#   prefix  - cumulative sums of daily with a leading 0, so any [start, end] total for a
+#             category is one subtraction
+class DailyCube:
+    def __init__(self, df_orders=None):
+        self.categories = pd.Index([], dtype=object)
+        self.products = pd.Index([], dtype=object)
+        self.frame = pd.DataFrame(columns=CELL_COLUMNS + ['Category', 'ProductName'])
+        self.days = np.array([], dtype=np.int32)
+        self.dates = np.array([], dtype=object)
+        self.first_ordinal = 0
+        self.num_days = 0
+        self.daily = {}
+        self.prefix = {}
+        if df_orders is not None:
+            self._add(df_orders)
+
+    # Sum order rows into cells, coded with the cube's category/product codes
+    def _cells(self, df_orders):
+        category_codes, self.categories = _encode(df_orders['Category'], self.categories)
+        product_codes, self.products = _encode(df_orders['ProductName'], self.products)
+        cells = pd.DataFrame({
+            'Day_Ordinal': df_orders['Day_Ordinal'].to_numpy(),
+            'Category_Code': category_codes,
+            'Product_Code': product_codes,
+            **{measure: _widened(df_orders[measure]) for measure in MEASURES},
+            ORDER_ROWS: np.ones(len(df_orders), dtype=np.int64),
+        })
+        return cells.groupby(CELL_KEYS, sort=True).sum().reset_index()
+
+    # Fold order rows into the cube
+    def _add(self, df_orders):
+        if df_orders.empty:
+            return
+        self._add_cells(self._cells(df_orders))
+
+    # Fold coded cells into the cube. Cells of days before the earliest new cell are
+    # kept as they are; only the touched days are regrouped.
+    def _add_cells(self, new_cells):
+        if self.frame.empty:
+            cells = new_cells
+        else:
+            first_new_day = new_cells['Day_Ordinal'].iat[0]
+            split = np.searchsorted(self.frame['Day_Ordinal'].to_numpy(), first_new_day, side='left')
+            redo = pd.concat([self.frame.iloc[split:][CELL_COLUMNS], new_cells])
+            redo = redo.groupby(CELL_KEYS, sort=True).sum().reset_index()
+            cells = pd.concat([self.frame.iloc[:split][CELL_COLUMNS], redo], ignore_index=True)
+
+        # Codes of -1 (missing names) come back as NaN, as in the raw orders
+        cells['Category'] = pd.Categorical.from_codes(cells['Category_Code'], categories=self.categories)
+        cells['ProductName'] = pd.Categorical.from_codes(cells['Product_Code'], categories=self.products)
+        self.frame = cells
+
+        # Sorted distinct order days, as day ordinals and Persian dates
+        self.days = np.union1d(self.days, new_cells['Day_Ordinal'].to_numpy()).astype(np.int32)
+        self.dates = calendar_for_ordinals(self.days).to_persian(self.days)
+
+        self._add_daily(new_cells)
+
+    # Add cells into the dense daily arrays, growing them to new days/categories
+    def _add_daily(self, new_cells):
+        day_ordinals = new_cells['Day_Ordinal'].to_numpy()
+        old_first, old_num_days = self.first_ordinal, self.num_days
+        first, last = int(day_ordinals.min()), int(day_ordinals.max())
+        if old_num_days:
+            first, last = min(first, old_first), max(last, old_first + old_num_days - 1)
+        self.first_ordinal, self.num_days = first, last - first + 1
+
+        num_categories = len(self.categories)
+        category_codes = new_cells['Category_Code'].to_numpy()
+        rows = np.where(category_codes >= 0, category_codes, num_categories)
+        columns = day_ordinals - first
+        offset = old_first - first
+
+        for measure in MEASURES + (ORDER_ROWS,):
+            values = new_cells[measure].to_numpy()
+            dtype = np.int64 if np.issubdtype(values.dtype, np.integer) else np.float64
+            old = self.daily.get(measure)
+
+            # Lay the old arrays onto the (possibly wider and taller) new grid
+            if old is not None:
+                dtype = np.result_type(dtype, old.dtype)
+            daily = np.zeros((num_categories + 2, self.num_days), dtype=dtype)
+            if old is not None:
+                old_categories = old.shape[0] - 2
+                daily[:old_categories, offset:offset + old_num_days] = old[:old_categories]
+                daily[num_categories, offset:offset + old_num_days] = old[old_categories]
+
+            cell_sums = np.bincount(rows * self.num_days + columns, weights=values, minlength=daily.size)
+            daily += cell_sums.reshape(daily.shape).astype(dtype)
+            daily[-1] = daily[:-1].sum(axis=0)
+
+            prefix = np.zeros((num_categories + 2, self.num_days + 1), dtype=dtype)
+            np.cumsum(daily, axis=1, out=prefix[:, 1:])
+            self.daily[measure] = daily
+            self.prefix[measure] = prefix
+
+    # New cube with rows appended; the original stays untouched for other sessions
+    def extended(self, new_rows):
+        cube = DailyCube.__new__(DailyCube)
+        cube.__dict__.update(self.__dict__)
+        cube.daily = dict(self.daily)
+        cube.prefix = dict(self.prefix)
+        cube._add(new_rows)
+        return cube
+
+    # Categories with at least one order row, sorted; the dimension table also keeps
+    # names that aliases merged away
+    def ordered_categories(self):
+        if ORDER_ROWS not in self.daily:
+            return []
+        rows = self.daily[ORDER_ROWS][:len(self.categories)]
+        return sorted(self.categories[rows.any(axis=1)].tolist())
+
+    # Row of daily/prefix for a category (None or 'All Categories' = every order)
+    def _row(self, category):
+        if category is None or category == ALL_CATEGORIES:
+            return len(self.categories) + 1
+        try:
+            return self.categories.get_loc(category)
+        except KeyError:
+            return None
+
+    # Sum of a measure over [start_ordinal, end_ordinal] for a category.
+    # Scalars or arrays of ranges; constant time per range via the prefix sums.
+    def total(self, measure, start_ordinal, end_ordinal, category=None):
+        row = self._row(category)
+        start = np.clip(np.asarray(start_ordinal) - self.first_ordinal, 0, self.num_days)
+        end = np.clip(np.asarray(end_ordinal) - self.first_ordinal + 1, 0, self.num_days)
+        end = np.maximum(start, end)
+        if row is None:
+            return np.zeros_like(start) if start.ndim else 0
+
+        prefix = self.prefix[measure][row]
+        totals = prefix[end] - prefix[start]
+        return totals if totals.ndim else totals.item()
+
+    # Daily values of a measure at the given day ordinals (0 outside the data span)
+    def daily_at(self, measure, day_ordinals, category=None):
+        row = self._row(category)
+        positions = np.asarray(day_ordinals) - self.first_ordinal
+        inside = (positions >= 0) & (positions < self.num_days)
+        values = np.zeros(len(positions), dtype=self.daily[measure].dtype)
+        if row is not None:
+            values[inside] = self.daily[measure][row, positions[inside]]
+        return values
+
+
+def _regroup(cells):
+    return pd.concat(cells, ignore_index=True).groupby(CELL_KEYS, sort=True).sum().reset_index()
+
+
+# Build the cube from a CSV streamed in chunks, so exports larger than RAM can be
+# aggregated: only one chunk of order lines and the (much smaller) cells are held
+def build_cube_streaming(csv_path, chunk_rows=500_000, progress=print_progress):
+    cube = DailyCube()
+    partial_cells = []
+    pending_cells = 0
+    for chunk in stream_orders(csv_path, chunk_rows, progress):
+        partial_cells.append(cube._cells(chunk))
+        pending_cells += len(partial_cells[-1])
+
+        # Keep the partial aggregates bounded as well
+        if pending_cells > STREAM_COMPACT_CELLS:
+            partial_cells = [_regroup(partial_cells)]
+            pending_cells = len(partial_cells[0])
+
+    if partial_cells:
+        cube._add_cells(_regroup(partial_cells))
+    return cube
+
+
+# The cube for the current version of Orders.csv, shared by every rerun and session.
+# With chunk_rows (or ORDERS_CHUNK_ROWS) set it is built by streaming the CSV and the
+# order lines themselves are never held in memory.
+def load_cube(csv_path='Orders.csv', chunk_rows=STREAM_CHUNK_ROWS):
+    if not chunk_rows:
+        return load_derived('daily_cube', DailyCube, csv_path)
+
+    key = os.path.abspath(csv_path)
+    stat = (file_stat(csv_path), rules_version())
+    with _streamed_lock:
+        cached = _streamed_cubes.get(key)
+        if cached is None or cached[0] != stat:
+            cached = (stat, build_cube_streaming(csv_path, chunk_rows))
+            _streamed_cubes[key] = cached
+        return cached[1]
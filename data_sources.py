@@ -0,0 +1,265 @@
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from analytics import ALL_CATEGORIES, period_ranges, product_period_matrix
+from daily_cube import MEASURES, ORDER_ROWS, load_cube
+from engine import PeriodComparison, ProductPeriodMatrix, TrackingReport, segment_table
+from orders_data import STREAM_CHUNK_ROWS, dataset_version, read_orders_csv
+from persian_calendar import build_calendar
+from shared_dataset import SHARED_DIR, file_version, shared_cube
+
+
+# Where the dashboard reads orders from. Orders.csv by default; with ORDERS_DB (an
+# ODBC connection string) or ORDERS_SQLITE (a database file) the orders table is
+# queried directly and only aggregated rows are fetched.
+ORDERS_DB = os.environ.get('ORDERS_DB') or None
+ORDERS_SQLITE = os.environ.get('ORDERS_SQLITE') or None
+ORDERS_DB_TABLE = os.environ.get('ORDERS_DB_TABLE', 'Orders')
+
+# Connections kept open per database between reruns
+POOL_SIZE = 4
+
+# Connection pools, shared by every rerun and session of the process
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# Open connections to one database, handed out one caller at a time and kept for the
+# next one. A connection that raised is closed instead of going back to the pool.
+class ConnectionPool:
+    def __init__(self, connect, size=POOL_SIZE):
+        self.connect = connect
+        self.idle = queue.LifoQueue(maxsize=size)
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        try:
+            yield conn
+        except Exception:
+            conn.close()
+            raise
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+def get_pool(key, connect, size=POOL_SIZE):
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(connect, size)
+        return _pools[key]
+
+
+# Orders from Orders.csv, answered from the daily cube (mapped from ORDERS_SHARED_DIR
+# when set, see shared_dataset.py)
+class CubeSource:
+    def __init__(self, csv_path='Orders.csv'):
+        self.csv_path = csv_path
+        self.key = ('csv', os.path.abspath(csv_path))
+        self.cube = shared_cube(csv_path) if SHARED_DIR else load_cube(csv_path)
+
+    # A streamed or mapped cube never loads the orders, so its version is the file's identity
+    def version(self):
+        if STREAM_CHUNK_ROWS or SHARED_DIR:
+            return file_version(self.csv_path)
+        return dataset_version(self.csv_path)
+
+    # Categories with order rows, by name. The cube's categories are every name of the
+    # dimension table in id order, including names an alias merged away since.
+    def categories(self):
+        return self.cube.ordered_categories()
+
+    def dates(self):
+        return self.cube.dates
+
+    # Dense daily series of a measure: first day ordinal and one value per day
+    def daily_values(self, category=None, measure='Quantity'):
+        row = self.cube._row(category)
+        if row is None:
+            return self.cube.first_ordinal, np.zeros(self.cube.num_days)
+        return self.cube.first_ordinal, self.cube.daily[measure][row]
+
+    # The cube works on day ordinals; calendar is taken for parity with the SQL sources
+    def comparison(self, start_ordinal, end_ordinal, category=None, calendar=None):
+        return PeriodComparison.from_cube(self.cube, start_ordinal, end_ordinal, category)
+
+    def report(self, calendar, start_ordinal, end_ordinal, num_divisions, category=None):
+        return TrackingReport.compute(self.cube, calendar, start_ordinal, end_ordinal, num_divisions, category)
+
+
+# Orders queried from a table with the export's columns (Persian Date_Formatted text,
+# Category, ProductName and the measures). Date ranges, the category and the period
+# bucketing go into the WHERE/GROUP BY clauses, so the database only returns sums.
+# Persian date strings sort in day order, so ranges are plain string comparisons.
+class SqlOrdersSource:
+    def __init__(self, pool, table=ORDERS_DB_TABLE):
+        self.pool = pool
+        self.table = f'[{table}]'
+        self.key = (id(pool), table)
+        # (version, dates, calendar) of the last dates() query
+        self._dates = None
+        self._dates_lock = threading.Lock()
+
+    def query(self, sql, params=()):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, list(params))
+                columns = [column[0] for column in cursor.description]
+                return pd.DataFrame.from_records([tuple(row) for row in cursor.fetchall()], columns=columns)
+            finally:
+                cursor.close()
+
+    # Category filter; the export writes some categories with a trailing space
+    def _where(self, start_persian, end_persian, category):
+        sql = 'Date_Formatted BETWEEN ? AND ?'
+        params = [start_persian, end_persian]
+        if category is not None and category != ALL_CATEGORIES:
+            sql += ' AND RTRIM(Category) = ?'
+            params.append(category)
+        return sql, params
+
+    # Changes whenever rows are added or removed
+    def version(self):
+        count, last_date = self.query(f'SELECT COUNT(*) AS n, MAX(Date_Formatted) AS d FROM {self.table}').iloc[0]
+        return hashlib.blake2b(f'{self.table}:{count}:{last_date}'.encode('utf-8'), digest_size=16).hexdigest()
+
+    def categories(self):
+        result = self.query(f'SELECT DISTINCT RTRIM(Category) AS Category FROM {self.table} '
+                            'WHERE Category IS NOT NULL ORDER BY 1')
+        return result['Category'].tolist()
+
+    # Order dates and their calendar, fetched once per version of the table (the
+    # DISTINCT scan ships every date, the version query a single row)
+    def _dates_calendar(self):
+        version = self.version()
+        with self._dates_lock:
+            if self._dates is None or self._dates[0] != version:
+                result = self.query(f"SELECT DISTINCT Date_Formatted FROM {self.table} "
+                                    "WHERE Date_Formatted IS NOT NULL AND Date_Formatted <> '0000-00-00' ORDER BY 1")
+                dates = result['Date_Formatted'].to_numpy(dtype=object)
+                self._dates = (version, dates, build_calendar(dates))
+            return self._dates[1:]
+
+    def dates(self):
+        return self._dates_calendar()[0]
+
+    def calendar(self):
+        return self._dates_calendar()[1]
+
+    # Measure sums and order rows per period of a period_ranges table (optionally per
+    # product), bucketed by the database: one CASE over the period start dates
+    def period_sums(self, ranges, category=None, by_product=False):
+        starts = ranges['Start_Persian'].tolist()
+        bucket = 'CASE ' + ' '.join(f'WHEN Date_Formatted >= ? THEN {n}' for n in ranges['Range_Number']) + ' END'
+        where, params = self._where(starts[-1], ranges['End_Persian'].iat[0], category)
+        product = ', ProductName' if by_product else ''
+        sums = ', '.join(f'SUM({measure}) AS {measure}' for measure in MEASURES)
+        sql = (f'SELECT Range_Number{product}, {sums}, COUNT(*) AS {ORDER_ROWS} FROM '
+               f'(SELECT {bucket} AS Range_Number{product}, {", ".join(MEASURES)} FROM {self.table} WHERE {where}) AS b '
+               f'GROUP BY Range_Number{product}')
+        result = self.query(sql, starts + params)
+        columns = ['Range_Number'] + (['ProductName'] if by_product else []) + list(MEASURES) + [ORDER_ROWS]
+        return result.reindex(columns=columns).astype({'Range_Number': np.int64, ORDER_ROWS: np.int64})
+
+    # Per-period sums aligned with the rows of ranges (0 for periods without orders)
+    def _aligned(self, ranges, category):
+        sums = self.period_sums(ranges, category).set_index('Range_Number')
+        return sums.reindex(ranges['Range_Number'], fill_value=0).infer_objects()
+
+    def comparison(self, start_ordinal, end_ordinal, category=None, calendar=None):
+        calendar = calendar if calendar is not None else self.calendar()
+        ranges = period_ranges(calendar, end_ordinal, end_ordinal - start_ordinal + 1, 2)
+        sums = self._aligned(ranges, category)
+        current, previous = ({measure: _scalar(sums[measure].iat[i]) for measure in MEASURES} for i in (0, 1))
+        return PeriodComparison(start_ordinal, end_ordinal, current, previous)
+
+    def daily(self, calendar, end_ordinal, num_days, num_divisions, category=None, measure='Quantity'):
+        dates = self.dates()
+        window_start = end_ordinal - num_days * num_divisions + 1
+        where, params = self._where(calendar.to_persian(window_start), calendar.to_persian(end_ordinal), category)
+        sums = self.query(f'SELECT Date_Formatted, SUM({measure}) AS {measure}, COUNT(*) AS {ORDER_ROWS} '
+                          f'FROM {self.table} WHERE {where} GROUP BY Date_Formatted', params)
+        positions = np.searchsorted(dates, sums['Date_Formatted'].to_numpy(dtype=object))
+        values = np.zeros(len(dates), dtype=np.int64)
+        rows = np.zeros(len(dates), dtype=np.int64)
+        values[positions] = sums[measure].to_numpy()
+        rows[positions] = sums[ORDER_ROWS].to_numpy()
+        return pd.DataFrame({'Date_Formatted': dates, measure: values, 'Has_Orders': rows > 0})
+
+    def daily_values(self, category=None, measure='Quantity'):
+        dates, calendar = self._dates_calendar()
+        where, params = self._where(dates[0], dates[-1], category)
+        sums = self.query(f'SELECT Date_Formatted, SUM({measure}) AS {measure} '
+                          f'FROM {self.table} WHERE {where} GROUP BY Date_Formatted', params)
+        first_ordinal = calendar.to_ordinal(dates[0])
+        values = np.zeros(calendar.to_ordinal(dates[-1]) - first_ordinal + 1)
+        if not sums.empty:
+            values[calendar.to_ordinal(sums['Date_Formatted'].to_numpy(dtype=object)) - first_ordinal] = sums[measure].to_numpy()
+        return first_ordinal, values
+
+    def report(self, calendar, start_ordinal, end_ordinal, num_divisions, category=None):
+        num_days = end_ordinal - start_ordinal + 1
+        ranges = period_ranges(calendar, end_ordinal, num_days, num_divisions)
+        sums = self._aligned(ranges, category)
+        segments = segment_table(ranges, sums['Quantity'].to_numpy(), sums[ORDER_ROWS].to_numpy())
+
+        # The product table covers the periods with any order, of any category
+        any_orders = self._aligned(ranges, None)[ORDER_ROWS].to_numpy() > 0
+        filtered = ranges[any_orders].reset_index(drop=True)
+        table = None
+        if not filtered.empty:
+            table = product_period_matrix(self.period_sums(ranges, category, by_product=True), filtered, 'Quantity')
+
+        params = {'start_ordinal': int(start_ordinal), 'end_ordinal': int(end_ordinal),
+                  'num_divisions': int(num_divisions), 'category': category}
+        return TrackingReport(params, self.comparison(start_ordinal, end_ordinal, category, calendar), ranges,
+                              self.daily(calendar, end_ordinal, num_days, num_divisions, category),
+                              segments, ProductPeriodMatrix(filtered, table))
+
+
+def _scalar(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+# Orders database over ODBC (SQL Server), through pooled pyodbc connections
+class OdbcOrdersSource(SqlOrdersSource):
+    def __init__(self, connection_string, table=ORDERS_DB_TABLE):
+        import pyodbc
+
+        super().__init__(get_pool(('odbc', connection_string), lambda: pyodbc.connect(connection_string)), table)
+
+
+# Local SQLite database with the same table, for testing without the orders server
+class SqliteOrdersSource(SqlOrdersSource):
+    def __init__(self, db_path, table=ORDERS_DB_TABLE):
+        super().__init__(get_pool(('sqlite', os.path.abspath(db_path)),
+                                  lambda: sqlite3.connect(db_path, check_same_thread=False)), table)
+
+    # Load an Orders.csv export into a SQLite table, indexed by date
+    @staticmethod
+    def import_csv(csv_path, db_path, table=ORDERS_DB_TABLE):
+        with sqlite3.connect(db_path) as conn:
+            read_orders_csv(csv_path).to_sql(table, conn, if_exists='replace', index=False)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS [{table}_date] ON [{table}] (Date_Formatted)')
+        return SqliteOrdersSource(db_path, table)
+
+
+def open_source(csv_path='Orders.csv'):
+    if ORDERS_DB:
+        return OdbcOrdersSource(ORDERS_DB)
+    if ORDERS_SQLITE:
+        return SqliteOrdersSource(ORDERS_SQLITE)
+    return CubeSource(csv_path)
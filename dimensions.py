@@ -0,0 +1,184 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+# JSON file of alias rules applied after normalization, per column:
+#     {"Category": {"موبایل": "گوشی موبایل"}, "ProductName": {...}}
+ORDERS_ALIASES = os.environ.get('ORDERS_ALIASES') or None
+
+# Bump this whenever normalize_text or TEXT_TRANSLATION changes, so data normalized
+# under the old rules gets rebuilt
+NORMALIZATION_VERSION = '1'
+
+# Arabic letters the exports mix with their Persian forms, Arabic-Indic and Persian
+# digits, and zero-width characters (ZWNJ and friends), which become a plain space
+# so 'گوشی‌موبایل' and 'گوشی موبایل' name the same thing
+TEXT_TRANSLATION = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ة': 'ه',
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+    **{character: ' ' for character in '\u200c\u200d\u200b\u200e\u200f\ufeff\u00a0'},
+})
+
+# Dimensions per CSV path with the rules_version they were loaded under, shared by
+# every load of the process
+_dimensions = {}
+_dimensions_lock = threading.Lock()
+
+
+# One name in its canonical form: Persian letters and ASCII digits, single spaces,
+# no leading or trailing whitespace. Missing values stay missing.
+def normalize_text(text):
+    if not isinstance(text, str):
+        return text
+    return ' '.join(text.translate(TEXT_TRANSLATION).split())
+
+
+# Alias rules of a JSON file, with both sides normalized
+def load_aliases(path):
+    with open(path, encoding='utf-8') as f:
+        rules = json.load(f)
+    return {column: {normalize_text(alias): normalize_text(name) for alias, name in aliases.items()}
+            for column, aliases in rules.items()}
+
+
+# Identity of the rules names are normalized with: NORMALIZATION_VERSION and the
+# contents of the alias file. Part of every dataset version, so editing the aliases
+# invalidates snapshots, cubes and cached results like a change of the CSV does.
+def rules_version(aliases_path=ORDERS_ALIASES):
+    digest = hashlib.blake2b(NORMALIZATION_VERSION.encode(), digest_size=8)
+    if aliases_path:
+        with open(aliases_path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Path of a dimension table kept next to the CSV (Orders.csv -> Orders.ProductName.parquet)
+def dimension_path(csv_path, column):
+    return f'{os.path.splitext(csv_path)[0]}.{column}.parquet'
+
+
+# Exclusive lock between processes on a file next to path (held while the lock file
+# stays open), so only one of them reads, extends and writes the table at a time
+@contextlib.contextmanager
+def _file_lock(path):
+    with open(f'{path}.lock', 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            yield
+
+
+# Names of one text column with a stable integer id each (the position in names).
+# Ids are handed out once, in name order for the names of a batch, and never change:
+# new names are appended and the table is written back to path. Every process
+# loading the same CSV shares the table, so new names are added under a file lock
+# after reading it again, taking over the ids the others handed out meanwhile.
+class DimensionTable:
+    def __init__(self, names=(), path=None):
+        self.names = list(names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.path = path
+
+    @classmethod
+    def load(cls, path):
+        if path is None or not os.path.exists(path):
+            return cls(path=path)
+        table = pd.read_parquet(path)
+        order = np.argsort(table['Id'].to_numpy(), kind='stable')
+        return cls(table['Name'].to_numpy(dtype=object)[order].tolist(), path)
+
+    # Ids of names, adding the ones not seen yet
+    def encode(self, names):
+        if any(name not in self.ids for name in names):
+            self.save(names)
+        return np.array([self.ids[name] for name in names], dtype=np.int64)
+
+    # Add names and write the table back to path
+    def save(self, names=()):
+        if self.path is None:
+            self._add(names)
+            return
+        try:
+            with _file_lock(self.path):
+                self._merge(DimensionTable.load(self.path).names)
+                self._add(names)
+                table = pd.DataFrame({'Id': np.arange(len(self.names), dtype=np.int32), 'Name': self.names})
+                tmp_path = f'{self.path}.{os.getpid()}.tmp'
+                table.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, self.path)
+        except OSError:
+            # A read-only deployment keeps the ids for this process only
+            self._add(names)
+
+    # New names get the next ids, in name order
+    def _add(self, names):
+        for name in sorted({name for name in names if name not in self.ids}):
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+
+    # Take over the ids of the saved table; names only this process knows (its
+    # writes failed) follow them
+    def _merge(self, saved):
+        known = set(saved)
+        self.names = list(saved) + [name for name in self.names if name not in known]
+        self.ids = {name: i for i, name in enumerate(self.names)}
+
+
+# Ingest-time normalization of the text columns of one dataset: names are normalized
+# and aliased once per distinct raw value, then coded with the ids of the column's
+# DimensionTable. Columns come out categorical with the table's names as categories,
+# so category codes are the dimension ids and grouping works on small integers.
+class Dimensions:
+    def __init__(self, csv_path=None, aliases_path=ORDERS_ALIASES):
+        self.csv_path = csv_path
+        self.rules = rules_version(aliases_path)
+        self.aliases = load_aliases(aliases_path) if aliases_path else {}
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def table(self, column):
+        if column not in self.tables:
+            path = dimension_path(self.csv_path, column) if self.csv_path else None
+            self.tables[column] = DimensionTable.load(path)
+        return self.tables[column]
+
+    def encode(self, column, values):
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        aliases = self.aliases.get(column, {})
+        names = [normalize_text(name) for name in uniques]
+        names = [aliases.get(name, name) for name in names]
+        with self.lock:
+            table = self.table(column)
+            ids = table.encode(names)
+            categories = pd.Index(table.names)
+        row_ids = np.where(codes >= 0, ids[codes] if len(ids) else 0, -1)
+        return pd.Categorical.from_codes(row_ids, categories=categories)
+
+
+# Dimensions of the dataset at csv_path (persisted next to it), or in-memory ones.
+# Loaded again when the alias file changes.
+def dimensions_for(csv_path=None):
+    if csv_path is None or not isinstance(csv_path, (str, os.PathLike)):
+        return Dimensions()
+    key = os.path.abspath(csv_path)
+    with _dimensions_lock:
+        dimensions = _dimensions.get(key)
+        if dimensions is None or dimensions.rules != rules_version():
+            dimensions = _dimensions[key] = Dimensions(csv_path)
+        return dimensions
@@ -0,0 +1,254 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from analytics import bucket_periods, period_ranges, ranges_with_data
+from daily_cube import MEASURES, ORDER_ROWS
+from parallel_matrix import build_product_matrix
+
+
+# Headless analytics of the tracking page: everything the dashboard shows, computed
+# from the daily cube without any Streamlit call, so it can be reused, tested and
+# precomputed (see batch_reports.py).
+
+
+# Growth of a measure in percent, 0 when there is nothing to compare against
+def growth_percent(current, previous):
+    return ((current - previous) / previous) * 100 if previous else 0
+
+
+# KPIs of [start_ordinal, end_ordinal] against the equally long range right before it
+class PeriodComparison:
+    def __init__(self, start_ordinal, end_ordinal, current, previous):
+        self.start_ordinal = int(start_ordinal)
+        self.end_ordinal = int(end_ordinal)
+        self.num_days = self.end_ordinal - self.start_ordinal + 1
+        self.previous_start_ordinal = self.start_ordinal - self.num_days
+        self.previous_end_ordinal = self.end_ordinal - self.num_days
+        self.current = current
+        self.previous = previous
+        self.growth = {measure: growth_percent(current[measure], previous[measure]) for measure in current}
+
+    @classmethod
+    def from_cube(cls, cube, start_ordinal, end_ordinal, category=None, measures=MEASURES):
+        num_days = end_ordinal - start_ordinal + 1
+        current = {m: cube.total(m, start_ordinal, end_ordinal, category) for m in measures}
+        previous = {m: cube.total(m, start_ordinal - num_days, end_ordinal - num_days, category) for m in measures}
+        return cls(start_ordinal, end_ordinal, current, previous)
+
+    def to_dict(self):
+        return {'start_ordinal': self.start_ordinal, 'end_ordinal': self.end_ordinal,
+                'current': self.current, 'previous': self.previous}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['start_ordinal'], data['end_ordinal'], data['current'], data['previous'])
+
+
+# Daily values of a measure for every order day of the cube, 0 outside the window of
+# num_divisions periods ending at end_ordinal. Has_Orders marks the window days that
+# have orders of the category.
+def daily_series(cube, end_ordinal, num_days, num_divisions, category=None, measure='Quantity'):
+    window_start = end_ordinal - num_days * num_divisions + 1
+    in_window = (cube.days >= window_start) & (cube.days <= end_ordinal)
+    return pd.DataFrame({
+        'Date_Formatted': cube.dates,
+        measure: np.where(in_window, cube.daily_at(measure, cube.days, category), 0),
+        'Has_Orders': in_window & (cube.daily_at(ORDER_ROWS, cube.days, category) > 0),
+    })
+
+
+# Total, order rows and daily average of a measure per period of a period_ranges
+# table (totals/rows given per period), for the periods that have orders
+def segment_table(ranges, totals, rows):
+    num_days = (ranges['End_Ordinal'] - ranges['Start_Ordinal'] + 1).to_numpy()
+    segments = ranges[['Range_Number', 'Start_Persian', 'End_Persian']].assign(Total=totals, Rows=rows)
+    segments = segments[segments['Rows'] > 0]
+    average = segments['Total'] / num_days[segments.index]
+    return segments.assign(Average=[round(value) for value in average]).reset_index(drop=True)
+
+
+# Same, with the per-period sums read off the cube
+def segment_averages(cube, ranges, category=None, measure='Quantity'):
+    starts = ranges['Start_Ordinal'].to_numpy()
+    ends = ranges['End_Ordinal'].to_numpy()
+    return segment_table(ranges, cube.total(measure, starts, ends, category),
+                         cube.total(ORDER_ROWS, starts, ends, category))
+
+
+# ProductName x period table of a measure for the periods that have orders.
+# table is None when no period has any.
+class ProductPeriodMatrix:
+    def __init__(self, ranges, table):
+        self.ranges = ranges
+        self.table = table
+        self._store = None
+
+    # Per-product series of the table, built on first use and kept with the matrix
+    @property
+    def store(self):
+        if self._store is None and self.table is not None:
+            self._store = ProductSeriesStore(self.table, len(self.ranges))
+        return self._store
+
+    @classmethod
+    def from_frame(cls, df, ranges, category=None, measure='Quantity'):
+        end_ordinal = int(ranges['End_Ordinal'].iat[0])
+        num_days = end_ordinal - int(ranges['Start_Ordinal'].iat[0]) + 1
+        bucketed = bucket_periods(df, end_ordinal, num_days, len(ranges), category)
+        filtered = ranges_with_data(df, ranges)
+        table = build_product_matrix(bucketed, filtered, measure) if not filtered.empty else None
+        return cls(filtered, table)
+
+
+# Period vectors of a product_period_matrix table, one row per product code, oldest
+# period first. A product's vector is one dict lookup and one row read, so any number
+# of products can be compared without scanning the table again.
+class ProductSeriesStore:
+    def __init__(self, table, num_periods):
+        period_columns = list(table.columns[1:1 + num_periods])[::-1]
+        self.table = table
+        self.labels = period_columns
+        self.products = table['ProductName'].to_numpy(dtype=object)
+        self.codes = {product: code for code, product in enumerate(self.products)}
+        self.values = table[period_columns].to_numpy()
+        self.totals = self.values.sum(axis=1)
+        self._folded = None
+        self._keys = {}
+
+    def __len__(self):
+        return len(self.products)
+
+    def code(self, product):
+        return self.codes.get(product)
+
+    def series(self, product):
+        return self.values[self.codes[product]]
+
+    # Period x product table of the given products
+    def compare(self, products):
+        codes = [self.codes[product] for product in products]
+        return pd.DataFrame(self.values[codes].T, index=self.labels, columns=list(products))
+
+    # The n products with the highest totals, best first
+    def top(self, n):
+        return self.products[self.ranked('Total', k=n)].tolist()
+
+    # Sort key of every product: its total, its best period, or the growth of the
+    # latest period over the one before (0 when that one had nothing, as growth_percent)
+    def rank_key(self, by='Total'):
+        if by not in self._keys:
+            if by == 'Total':
+                key = self.totals
+            elif by == 'Max':
+                key = self.values.max(axis=1) if len(self.labels) else self.totals
+            elif by == 'Growth':
+                key = np.zeros(len(self.products))
+                if len(self.labels) > 1:
+                    current, previous = self.values[:, -1], self.values[:, -2]
+                    np.divide((current - previous) * 100, previous, out=key, where=previous != 0)
+            else:
+                raise ValueError(f'unknown ranking: {by}')
+            self._keys[by] = key
+        return self._keys[by]
+
+    # Codes of the k best products by a rank_key (all of them without k), best first,
+    # ties in table order. Only the top k are sorted: the rest is cut off with a
+    # partition first. codes restricts the ranking to those products.
+    def ranked(self, by='Total', k=None, codes=None):
+        key = self.rank_key(by)
+        codes = np.arange(len(self.products)) if codes is None else np.asarray(codes, dtype=np.int64)
+        if k is not None and k < len(codes):
+            if k <= 0:
+                return codes[:0]
+            # Everything at least as good as the k-th best (ties at the cut are all kept)
+            kth = np.partition(key[codes], len(codes) - k)[len(codes) - k]
+            codes = codes[key[codes] >= kth]
+        order = np.lexsort((codes, -key[codes]))
+        return codes[order][:k]
+
+    # Codes of the products whose name contains text (case-insensitive), in table order
+    def search(self, text):
+        if not text:
+            return np.arange(len(self.products))
+        if self._folded is None:
+            self._folded = pd.Series(self.products, dtype=object).str.casefold()
+        matches = self._folded.str.contains(text.casefold(), regex=False, na=False).to_numpy()
+        return np.flatnonzero(matches)
+
+    # Rows of the table for the given codes, in their order
+    def rows(self, codes):
+        return self.table.iloc[np.asarray(codes, dtype=np.int64)]
+
+    # Bytes the store holds on top of its table (the values are a copy of the period
+    # columns, the names Python strings of their own), counting the casefolded names
+    # and rank keys built by the first search and rankings up front
+    def memory_bytes(self):
+        names = self.products.nbytes + sum(sys.getsizeof(product) for product in self.products)
+        keys = 2 * self.totals.nbytes
+        return self.values.nbytes + self.totals.nbytes + sys.getsizeof(self.codes) + 2 * names + keys
+
+
+# Everything the tracking page shows for one selection
+class TrackingReport:
+    def __init__(self, params, comparison, ranges, daily, segments, matrix):
+        self.params = params
+        self.comparison = comparison
+        self.ranges = ranges
+        self.daily = daily
+        self.segments = segments
+        self.matrix = matrix
+
+    @classmethod
+    def compute(cls, cube, calendar, start_ordinal, end_ordinal, num_divisions, category=None):
+        num_days = end_ordinal - start_ordinal + 1
+        ranges = period_ranges(calendar, end_ordinal, num_days, num_divisions)
+        params = {'start_ordinal': int(start_ordinal), 'end_ordinal': int(end_ordinal),
+                  'num_divisions': int(num_divisions), 'category': category}
+        return cls(
+            params,
+            PeriodComparison.from_cube(cube, start_ordinal, end_ordinal, category),
+            ranges,
+            daily_series(cube, end_ordinal, num_days, num_divisions, category),
+            segment_averages(cube, ranges, category),
+            ProductPeriodMatrix.from_frame(cube.frame, ranges, category),
+        )
+
+    # Bytes of the tables and of the product store. The store is built here if it is
+    # not yet: the report is sized when it is cached, the store on first render.
+    def memory_bytes(self):
+        frames = [self.ranges, self.daily, self.segments, self.matrix.ranges, self.matrix.table]
+        nbytes = 1024 + sum(int(frame.memory_usage(deep=True).sum()) for frame in frames if frame is not None)
+        if self.matrix.store is not None:
+            nbytes += self.matrix.store.memory_bytes()
+        return nbytes
+
+    # One directory per report: the parameters and KPIs as JSON, the tables as Parquet
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'report.json'), 'w', encoding='utf-8') as f:
+            json.dump({'params': self.params, 'comparison': self.comparison.to_dict()}, f, ensure_ascii=False)
+        self.ranges.to_parquet(os.path.join(path, 'ranges.parquet'), index=False)
+        self.daily.to_parquet(os.path.join(path, 'daily.parquet'), index=False)
+        self.segments.to_parquet(os.path.join(path, 'segments.parquet'), index=False)
+        self.matrix.ranges.to_parquet(os.path.join(path, 'matrix_ranges.parquet'), index=False)
+        if self.matrix.table is not None:
+            self.matrix.table.to_parquet(os.path.join(path, 'matrix.parquet'), index=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, 'report.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        matrix_path = os.path.join(path, 'matrix.parquet')
+        return cls(
+            meta['params'],
+            PeriodComparison.from_dict(meta['comparison']),
+            pd.read_parquet(os.path.join(path, 'ranges.parquet')),
+            pd.read_parquet(os.path.join(path, 'daily.parquet')),
+            pd.read_parquet(os.path.join(path, 'segments.parquet')),
+            ProductPeriodMatrix(pd.read_parquet(os.path.join(path, 'matrix_ranges.parquet')),
+                                pd.read_parquet(matrix_path) if os.path.exists(matrix_path) else None),
+        )
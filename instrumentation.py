@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+# Show the last rerun's stage timings in the sidebar
+TRACE_PANEL = os.environ.get('ORDERS_TRACE_PANEL', '') not in ('', '0')
+
+# Append every rerun's trace to this JSONL file
+TRACE_FILE = os.environ.get('ORDERS_TRACE_FILE') or None
+
+_export_lock = threading.Lock()
+
+
+# Resident memory of the process in bytes (None where it cannot be read cheaply)
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Timing spans of one run of the pipeline. Each span records its wall time, the
+# change in resident memory and, when the stage sets it, the number of rows it handled:
+#
+#     with trace.span('product_matrix') as span:
+#         summary_df = product_period_matrix(...)
+#         span['rows'] = len(summary_df)
+#
+# Straight-line scripts can use stage() instead, which closes the open span and
+# opens the next one, and finish() after the last stage.
+class Trace:
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.created = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+        self.spans = []
+        self._open = None
+        self._open_record = None
+
+    @contextmanager
+    def span(self, stage, rows=None):
+        record = {'stage': stage, 'rows': rows}
+        memory_before = rss_bytes()
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - started
+            memory_after = rss_bytes()
+            record['memory_delta'] = None if memory_before is None or memory_after is None else memory_after - memory_before
+            self.spans.append(record)
+
+    def stage(self, stage, rows=None):
+        self.finish()
+        self._open = self.span(stage, rows)
+        self._open_record = self._open.__enter__()
+
+    # Row count of the open stage
+    def count(self, rows):
+        if self._open_record is not None:
+            self._open_record['rows'] = int(rows)
+
+    def finish(self):
+        if self._open is not None:
+            self._open.__exit__(None, None, None)
+            self._open = self._open_record = None
+
+    def total_seconds(self):
+        return sum(span['seconds'] for span in self.spans)
+
+    def to_dict(self):
+        return {'name': self.name, 'created': self.created, **self.labels,
+                'total_seconds': self.total_seconds(), 'spans': self.spans}
+
+    # Append the trace as one JSON line; safe with several sessions writing at once
+    def export(self, path=TRACE_FILE):
+        if not path:
+            return
+        line = json.dumps(self.to_dict(), ensure_ascii=False, default=str)
+        with _export_lock, open(path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+# Sidebar table of a trace's spans (streamlit is only imported when it is shown)
+def show_trace_panel(trace):
+    import pandas as pd
+    import streamlit as st
+
+    table = pd.DataFrame(trace.spans, columns=['stage', 'seconds', 'rows', 'memory_delta'])
+    table['ms'] = (table['seconds'] * 1000).round(1)
+    table['memory_delta_mb'] = (table['memory_delta'] / (1 << 20)).round(1)
+    st.sidebar.subheader('Rerun timings')
+    st.sidebar.write(f'Total: {trace.total_seconds() * 1000:.0f} ms')
+    st.sidebar.dataframe(table[['stage', 'ms', 'rows', 'memory_delta_mb']], hide_index=True)
+    for name, value in trace.labels.items():
+        st.sidebar.caption(f'{name}: {value}')
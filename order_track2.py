@@ -1,44 +1,38 @@
 import streamlit as st
 import pandas as pd
-import altair as alt
-from PIL import Image
-from convertdate import persian
-from datetime import datetime, timedelta
+from datetime import timedelta
+from orders_data import load_orders, slice_days
+from persian_calendar import build_calendar, to_day_ordinal
+from analytics import bucket_periods, period_ranges, period_totals
+from daily_cube import load_cube
+from assets import asset_bytes, asset_text
 
 # Page setting
 st.set_page_config(layout="wide")
 
-# Load custom CSS
-with open('style.css') as f:
-    st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+# Load custom CSS (read once per process, see assets.py)
+st.markdown(f'<style>{asset_text("style.css")}</style>', unsafe_allow_html=True)
 
-# Display image
-image = Image.open('dgland_icon.png')
-st.image(image, width=100)  # Adjust width as needed
+# Display image (the PNG bytes go to the browser as they are, without decoding)
+st.image(asset_bytes('dgland_icon.png'), width=100)  # Adjust width as needed
 
-# Load dataset
-df_orders = pd.read_csv('Orders.csv')
+# Load dataset (parsed, cleaned and cached once per version of Orders.csv)
+df_orders = load_orders('Orders.csv')
 
-# Clean up category data
-df_orders['Category'] = df_orders['Category'].replace('گوشی موبایل ', 'گوشی موبایل')
-categories = ['All Categories'] + df_orders['Category'].unique().tolist()
+# Daily cube (orders summed per day/category/product), built once per dataset
+cube = load_cube('Orders.csv')
 
-# Formatting and cleaning date values
-df_orders['Date_Formatted'] = df_orders['Date_Formatted'].fillna('0000-00-00')
-df_orders = df_orders[df_orders['Date_Formatted'] != '0000-00-00']
+# Category and date cleanup already happened in load_orders (names merged by aliases
+# have no orders left and are not offered)
+categories = ['All Categories'] + cube.ordered_categories()
+sorted_dates = list(cube.dates)
 
-# Ensure date is a string format
-df_orders['Date_value'] = df_orders['Date_Formatted'].str.replace('-', '').astype(str)
-sorted_dates = sorted(df_orders['Date_Formatted'].unique())
+# Persian calendar dimension covering the data span (built once per span)
+calendar = build_calendar(sorted_dates)
 
-# Function to convert Persian date to Gregorian date
-def persian_to_gregorian(persian_date_str):
-    year, month, day = map(int, persian_date_str.split('-'))
-    gregorian_date = persian.to_gregorian(year, month, day)
-    return datetime(gregorian_date[0], gregorian_date[1], gregorian_date[2])
-    
-# Convert Persian dates to Gregorian
-df_orders['Gregorian_Date'] = df_orders['Date_Formatted'].apply(persian_to_gregorian)
+# Convert day ordinals to Gregorian dates (vectorized, no per-row conversion)
+# (assign returns a new frame so the shared cached frame is left untouched)
+df_orders = df_orders.assign(Gregorian_Date=pd.to_datetime(calendar.to_gregorian(df_orders['Day_Ordinal'])))
 
 # Date range selection using calendar widget
 b1, b2 = st.columns(2)
@@ -51,10 +45,9 @@ start_date, end_date = b1.date_input(
 )
 selected_category = b2.selectbox('Select Category', categories)
 
-# Convert Gregorian dates back to Persian format
+# Convert Gregorian dates back to Persian format (calendar lookup)
 def gregorian_to_persian(gregorian_date):
-    persian_date = persian.from_gregorian(gregorian_date.year, gregorian_date.month, gregorian_date.day)
-    return f'{persian_date[0]:04}-{persian_date[1]:02}-{persian_date[2]:02}'
+    return calendar.to_persian(to_day_ordinal(gregorian_date))
 
 # Convert the selected Gregorian dates back to Persian format
 start_date_persian = gregorian_to_persian(start_date)
@@ -71,29 +64,21 @@ previous_start_date_persian = gregorian_to_persian(previous_start_date)
 previous_end_date_persian = gregorian_to_persian(previous_end_date)
 
 # Filter DataFrame by date and category
-filtered_df = df_orders[
-    (df_orders['Gregorian_Date'] >= start_date) &
-    (df_orders['Gregorian_Date'] <= end_date)
-]
-
-# Filter DataFrame by current and previous date ranges
-current_filtered_df = df_orders[(df_orders['Date_Formatted'] >= start_date_persian) & (df_orders['Date_Formatted'] <= end_date_persian)]
-previous_filtered_df = df_orders[(df_orders['Date_Formatted'] >= previous_start_date_persian) & (df_orders['Date_Formatted'] <= previous_end_date_persian)]
+filtered_df = slice_days(df_orders, to_day_ordinal(start_date), to_day_ordinal(end_date))
 
-# Apply category filter if necessary
-if selected_category != 'All Categories':
-    current_filtered_df = current_filtered_df[current_filtered_df['Category'] == selected_category]
-    previous_filtered_df = previous_filtered_df[previous_filtered_df['Category'] == selected_category]
+# Current and previous date ranges as day ordinals
+current_range = (to_day_ordinal(start_date), to_day_ordinal(end_date))
+previous_range = (to_day_ordinal(previous_start_date), to_day_ordinal(previous_end_date))
 
-# Calculate metrics for the current date range
-current_total_sales = current_filtered_df['TotalPrice'].sum()
-current_total_volume = current_filtered_df['Quantity'].sum()
-current_total_net = current_filtered_df['TotalNetPrice'].sum()
+# Calculate metrics for the current date range (prefix-sum lookups on the daily cube)
+current_total_sales = cube.total('TotalPrice', *current_range, selected_category)
+current_total_volume = cube.total('Quantity', *current_range, selected_category)
+current_total_net = cube.total('TotalNetPrice', *current_range, selected_category)
 
 # Calculate metrics for the previous date range
-previous_total_sales = previous_filtered_df['TotalPrice'].sum()
-previous_total_volume = previous_filtered_df['Quantity'].sum()
-previous_total_net = previous_filtered_df['TotalNetPrice'].sum()
+previous_total_sales = cube.total('TotalPrice', *previous_range, selected_category)
+previous_total_volume = cube.total('Quantity', *previous_range, selected_category)
+previous_total_net = cube.total('TotalNetPrice', *previous_range, selected_category)
 
 
 # Calculate growth percentages
@@ -134,35 +119,20 @@ def format_persian_date(date_str):
     return date_str
 
 
-# Create additional date ranges
-additional_ranges = []
-for i in range(0, 6):
-    additional_start_date = start_date - timedelta(days=num_days * i)
-    additional_end_date = end_date - timedelta(days=num_days * i)
-    additional_ranges.append((additional_start_date, additional_end_date))
-
-# Convert additional date ranges to Persian format
-additional_ranges_persian = [(gregorian_to_persian(start), gregorian_to_persian(end)) for start, end in additional_ranges]
+# Create additional date ranges, converting all boundaries in one calendar lookup
+num_divisions = 6
+additional_ranges_table = period_ranges(calendar, to_day_ordinal(end_date), num_days, num_divisions)
+additional_ranges_persian = list(zip(additional_ranges_table['Start_Persian'], additional_ranges_table['End_Persian']))
 
-all_ranges_dfs = []
-
-# Adding additional date range data
-for idx, (start, end) in enumerate(additional_ranges_persian):
-    additional_filtered_df = df_orders[(df_orders['Date_Formatted'] >= start) & (df_orders['Date_Formatted'] <= end)]
-    
-    # Apply category filter if necessary
-    if selected_category != 'All Categories':
-        additional_filtered_df = additional_filtered_df[additional_filtered_df['Category'] == selected_category]
-    additional_filtered_df['Range_Number'] = idx
-
-    all_ranges_dfs.append(additional_filtered_df)
-    
-
-combined_df = pd.concat(all_ranges_dfs, ignore_index=True)
-# Sort the combined DataFrame by date
-combined_df_sorted = combined_df.sort_values(by='Date_Formatted')
-# Aggregate total quantity per day for all ranges combined
-daily_quantity_combined = combined_df_sorted.groupby('Date_Formatted')['Quantity'].sum().reset_index()
+# Give every order of the selected category in the whole window its Range_Number
+# in one vectorized pass (rows stay ordered by Day_Ordinal, so no sort is needed)
+combined_df = bucket_periods(df_orders, to_day_ordinal(end_date), num_days, num_divisions, selected_category)
+combined_df_sorted = combined_df
+# Aggregate total quantity per day for all ranges combined (in 64 bits: the loaded
+# Quantity column is downcast) and label the days with their Persian dates
+daily_quantity_combined = combined_df_sorted.astype({'Quantity': 'int64'}).groupby('Day_Ordinal')['Quantity'].sum().reset_index()
+daily_quantity_combined.insert(0, 'Date_Formatted', calendar.to_persian(daily_quantity_combined['Day_Ordinal']))
+combined_dates = set(daily_quantity_combined['Date_Formatted'])
 
 
 # Create a single bar chart with all the data
@@ -171,10 +141,7 @@ fig_combined.update_xaxes(type='category')
 
 line_positions = [end for start, end in additional_ranges_persian]
 
-line_pos = []
-for i in line_positions:
-  if i in combined_df['Date_Formatted'].unique():
-    line_pos.append(i)
+line_pos = [i for i in line_positions if i in combined_dates]
 
   # Create the bar chart
 fig_combined = px.bar(
@@ -201,20 +168,15 @@ fig_combined.update_xaxes(type='category')
 total_quantities = []
 average_quantities = []
 
+# Per-segment totals straight from the bucketed frame
+segment_totals, segment_rows = period_totals(combined_df, num_divisions, 'Quantity')
+
 # Loop through each segment between red lines
-for i, ii in additional_ranges_persian:
-    end_line = ii
-    start_line = i
+for (start_line, end_line), tot_quantity, row_count in zip(additional_ranges_persian, segment_totals, segment_rows):
     print(f'{start_line} and {end_line}')
 
-    # Filter data between the start and end lines
-    segment_df = combined_df_sorted[(combined_df_sorted['Date_Formatted'] >= start_line) & 
-                                    (combined_df_sorted['Date_Formatted'] <= end_line)]
-
-
-    if not segment_df.empty:
+    if row_count > 0:
         # Calculate th-e average quantity for this segment
-        tot_quantity = segment_df['Quantity'].sum()
         avg_quantity = tot_quantity / num_days
         total_quantities.append((end_line, tot_quantity))
         average_quantities.append((end_line, round(avg_quantity)))
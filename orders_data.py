@@ -0,0 +1,429 @@
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from dimensions import Dimensions, dimensions_for, rules_version
+from persian_calendar import build_calendar
+
+
+# Bump this whenever clean_orders changes so stale snapshots get rebuilt
+SNAPSHOT_VERSION = '5'
+
+# Bytes hashed at the end of the covered part of the CSV to check that a grown
+# file only had rows appended
+EDGE_BYTES = 1 << 16
+
+# Rewrite the snapshot once the rows appended since it was written exceed this
+# fraction of the bytes it covers
+SNAPSHOT_REFRESH_FRACTION = 0.1
+
+# Declared schema of the columns the dashboards use, so the parser does not have to
+# infer types (holding whole columns as strings first). Integer measures are nullable:
+# rows without a date usually have no measures either, and are only dropped by
+# clean_orders.
+ORDERS_DTYPES = {
+    'Date_Formatted': object,
+    'Category': object,
+    'ProductName': object,
+    'Quantity': 'Int64',
+    'TotalPrice': 'Int64',
+    'TotalNetPrice': 'float64',
+}
+
+# Text columns kept dictionary-encoded: int codes plus one shared lookup table
+CATEGORY_COLUMNS = ['Category', 'ProductName']
+MEASURE_COLUMNS = ['Quantity', 'TotalPrice', 'TotalNetPrice']
+
+# Rows per chunk when aggregates are built by streaming the CSV (ORDERS_CHUNK_ROWS);
+# unset means the whole export is loaded into memory
+STREAM_CHUNK_ROWS = int(os.environ.get('ORDERS_CHUNK_ROWS', '0')) or None
+
+# Process-wide cache: Streamlit keeps imported modules alive between reruns and
+# sessions, so every rerun of the dashboard reuses the frame parsed here
+_orders_cache = {}
+_orders_lock = threading.RLock()
+
+
+# Smallest dtype that holds every value exactly. Integers go down to int8 and floats
+# to float32 only when no value changes, so aggregate them with 64-bit accumulators.
+def downcast(column):
+    if pd.api.types.is_integer_dtype(column):
+        return pd.to_numeric(column, downcast='integer')
+    if pd.api.types.is_float_dtype(column):
+        narrow = column.astype(np.float32)
+        if (narrow.astype(np.float64) == column)[column.notna()].all():
+            return narrow
+    return column
+
+
+# Measures as plain numpy columns: a missing value adds nothing to a sum, so it is 0
+def fill_measures(df_orders):
+    return df_orders.assign(**{
+        column: df_orders[column].fillna(0).astype(
+            np.int64 if pd.api.types.is_integer_dtype(df_orders[column]) else np.float64)
+        for column in MEASURE_COLUMNS})
+
+
+# Compact representation: categorical text columns and downcast measures
+def compact_orders(df_orders):
+    for column in CATEGORY_COLUMNS:
+        df_orders[column] = df_orders[column].astype('category')
+    for column in MEASURE_COLUMNS:
+        df_orders[column] = downcast(df_orders[column])
+    return df_orders
+
+
+# Clean up the raw export the same way the dashboards used to do it inline. Text
+# columns are coded with the ids of dimensions (the dataset's, see dimensions_for).
+def clean_orders(df_orders, dimensions=None):
+    # Formatting and cleaning date values
+    df_orders = df_orders[df_orders['Date_Formatted'].notna() & (df_orders['Date_Formatted'] != '0000-00-00')]
+    df_orders = fill_measures(df_orders)
+
+    # Normalized category and product names (Persian yeh/kaf, digits, zero-width
+    # characters, whitespace, alias rules), which also merges the export's
+    # 'گوشی موبایل ' variant into 'گوشی موبایل'
+    dimensions = dimensions if dimensions is not None else Dimensions()
+    df_orders = df_orders.assign(**{column: dimensions.encode(column, df_orders[column])
+                                    for column in CATEGORY_COLUMNS})
+
+    # int32 day index instead of the date strings, kept sorted so date ranges can be
+    # sliced by binary search (persian_calendar turns it back into Persian dates)
+    if df_orders.empty:
+        day_ordinals = np.empty(0, dtype=np.int32)
+    else:
+        day_ordinals = build_calendar(df_orders['Date_Formatted']).to_ordinal(df_orders['Date_Formatted'])
+    df_orders = df_orders.drop(columns='Date_Formatted').assign(Day_Ordinal=day_ordinals)
+
+    df_orders = compact_orders(df_orders)
+    df_orders = df_orders.sort_values('Day_Ordinal', kind='stable')
+    return df_orders.reset_index(drop=True)
+
+
+# Bytes per row of each column for the frame the dashboards used to build (raw CSV
+# plus the Date_value string column) and for the compact frame load_orders serves
+def memory_report(csv_path='Orders.csv'):
+    before = pd.read_csv(csv_path)
+    before['Date_value'] = before['Date_Formatted'].fillna('0000-00-00').str.replace('-', '').astype(str)
+    after = load_orders(csv_path)
+
+    report = pd.DataFrame({
+        'before': before.memory_usage(deep=True, index=False) / max(len(before), 1),
+        'after': after.memory_usage(deep=True, index=False) / max(len(after), 1),
+    })
+    report.loc['Total'] = report.sum()
+    report['saved %'] = (1 - report['after'] / report['before']) * 100
+    return report.round(1)
+
+
+# Positional bounds of the rows with start_ordinal <= Day_Ordinal <= end_ordinal.
+# df_orders must be sorted by Day_Ordinal, which load_orders guarantees.
+# Also accepts arrays of ranges and then returns arrays of bounds.
+def day_bounds(df_orders, start_ordinal, end_ordinal):
+    day_ordinals = df_orders['Day_Ordinal'].to_numpy()
+    start = np.searchsorted(day_ordinals, start_ordinal, side='left')
+    end = np.searchsorted(day_ordinals, end_ordinal, side='right')
+    return start, np.maximum(start, end)
+
+
+# Orders inside [start_ordinal, end_ordinal]: O(log n) search plus a positional
+# slice, which pandas returns as a view instead of copying the rows
+def slice_days(df_orders, start_ordinal, end_ordinal):
+    start, end = day_bounds(df_orders, start_ordinal, end_ordinal)
+    return df_orders.iloc[start:end]
+
+
+def read_orders_csv(source, **kwargs):
+    return pd.read_csv(source, dtype=ORDERS_DTYPES, **kwargs)
+
+
+# Default progress callback for streamed ingestion
+def print_progress(rows, elapsed):
+    print(f'{rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)')
+
+
+# Cleaned orders in chunks of chunk_rows, reading only the dashboard's columns with
+# their declared dtypes, so peak memory is bounded by the chunk size rather than the
+# export. progress(rows, elapsed_seconds) is called after each chunk is consumed.
+def stream_orders(csv_path, chunk_rows=500_000, progress=print_progress):
+    started = time.perf_counter()
+    rows = 0
+    with read_orders_csv(csv_path, usecols=list(ORDERS_DTYPES), chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            rows += len(chunk)
+            yield clean_orders(chunk, dimensions_for(csv_path))
+            if progress is not None:
+                progress(rows, time.perf_counter() - started)
+
+
+# Path of the typed snapshot kept next to the CSV (Orders.csv -> Orders.parquet)
+def snapshot_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+# Cheap identity of the source file, checked on every call
+def file_stat(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+# Content hash (of the first length bytes), only computed when size/mtime no longer
+# match the snapshot or when a snapshot is written
+def file_hash(path, length=None, block_size=1 << 20):
+    return file_digest(path, length, block_size).hexdigest()
+
+
+# The running hash object behind file_hash, which appended bytes can be fed into
+def file_digest(path, length=None, block_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        remaining = length if length is not None else float('inf')
+        while remaining > 0:
+            block = f.read(int(min(block_size, remaining)))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest
+
+
+# Hash of the EDGE_BYTES before offset, and whether offset falls right after a line
+# break. Matching edges tell that a grown file only had rows appended after offset.
+def edge_hash(path, offset):
+    start = max(0, offset - EDGE_BYTES)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(offset - start)
+    return hashlib.blake2b(data, digest_size=16).hexdigest(), data.endswith(b'\n')
+
+
+def _read_snapshot_meta(path):
+    import pyarrow.parquet as pq
+
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except (OSError, ValueError):
+        return None
+    return {key.decode(): value.decode() for key, value in metadata.items()}
+
+
+def _write_snapshot(df_orders, path, meta):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df_orders, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata.update({key.encode(): str(value).encode() for key, value in meta.items()})
+    table = table.replace_schema_metadata(metadata)
+
+    # Write to a temp file and swap it in so readers never see a partial snapshot
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+# Cache entry for a loaded dataset. stat is the (size, mtime) of the CSV bytes the
+# frame covers, edge the edge_hash at that size, hash the dataset version id (the
+# file_hash of those bytes) and digest its running hash object, None until needed.
+def _entry(stat, edge, source_hash, df_orders, snapshot_size, derived=None, digest=None):
+    return {
+        'stat': stat,
+        'edge': edge,
+        'hash': source_hash,
+        'digest': digest,
+        'orders': df_orders,
+        'snapshot_size': snapshot_size,
+        'derived': derived if derived is not None else {},
+    }
+
+
+# Cache entry built from the snapshot if it still describes csv_path (or a prefix of
+# it that later rows were appended to), otherwise None
+def _load_snapshot(csv_path, stat):
+    path = snapshot_path(csv_path)
+    if not os.path.exists(path):
+        return None
+
+    meta = _read_snapshot_meta(path)
+    if not meta or meta.get('snapshot_version') != SNAPSHOT_VERSION or meta.get('rules_version') != rules_version():
+        return None
+
+    size, mtime_ns = stat
+    covered = int(meta.get('source_size', -1))
+    covered_stat = (covered, int(meta.get('source_mtime_ns', 0)))
+    source_hash = meta.get('source_hash')
+    if covered == size and covered_stat != stat:
+        # Same size but touched: only trust the snapshot if the bytes are identical
+        if file_hash(csv_path) != source_hash:
+            return None
+        covered_stat = stat
+    elif covered < size:
+        # Grown file: usable as long as the covered bytes were only appended to
+        if edge_hash(csv_path, covered)[0] != meta.get('source_edge_hash'):
+            return None
+    elif covered > size:
+        return None
+
+    return _entry(covered_stat, meta.get('source_edge_hash'), source_hash, pd.read_parquet(path), covered)
+
+
+def _save_snapshot(csv_path, entry, source_hash):
+    size, mtime_ns = entry['stat']
+    meta = {
+        'snapshot_version': SNAPSHOT_VERSION,
+        'rules_version': rules_version(),
+        'source_size': size,
+        'source_mtime_ns': mtime_ns or 0,
+        'source_hash': source_hash,
+        'source_edge_hash': entry['edge'],
+    }
+    try:
+        _write_snapshot(entry['orders'], snapshot_path(csv_path), meta)
+    except OSError:
+        # A read-only deployment still gets the in-memory cache
+        return
+    entry['snapshot_size'] = size
+
+
+# Parse and clean the CSV, refreshing the snapshot next to it
+def _build_orders(csv_path, stat):
+    digest = file_digest(csv_path, stat[0])
+    source_hash = digest.hexdigest()
+    df_orders = clean_orders(read_orders_csv(csv_path), dimensions_for(csv_path))
+
+    if file_stat(csv_path) != stat:
+        # Written to while we were reading: serve this frame, but without an edge
+        # no rows get appended onto it and the next call reloads in full
+        return _entry(stat, None, source_hash, df_orders, 0)
+
+    entry = _entry(stat, edge_hash(csv_path, stat[0])[0], source_hash, df_orders, 0, digest=digest)
+    _save_snapshot(csv_path, entry, source_hash)
+    return entry
+
+
+# Give the categorical columns of both frames the same lookup table so concatenating
+# them stays categorical: existing codes are kept and new values appended
+def _align_categories(df_orders, new_rows):
+    for column in CATEGORY_COLUMNS:
+        extra = new_rows[column].cat.categories.difference(df_orders[column].cat.categories)
+        if len(extra):
+            df_orders = df_orders.assign(**{column: df_orders[column].cat.add_categories(extra)})
+        categories = df_orders[column].cat.categories
+        new_rows = new_rows.assign(**{column: new_rows[column].cat.set_categories(categories)})
+    return df_orders, new_rows
+
+
+# Add newly parsed rows to the orders frame, keeping it sorted by Day_Ordinal.
+# Rows for later days (the usual append) are concatenated without any sort.
+def append_orders(df_orders, new_rows):
+    if new_rows.empty:
+        return df_orders
+    df_orders, new_rows = _align_categories(df_orders, new_rows)
+    combined = pd.concat([df_orders, new_rows], ignore_index=True)
+    if not df_orders.empty and new_rows['Day_Ordinal'].min() < df_orders['Day_Ordinal'].iat[-1]:
+        combined = combined.sort_values('Day_Ordinal', kind='stable').reset_index(drop=True)
+    return combined
+
+
+# Incremental ingest: when the CSV only had rows appended since entry was loaded, parse
+# just the new bytes and extend the frame and every derived structure that supports
+# it (an extended(new_rows) method); other structures are rebuilt on next use.
+# Returns the new cache entry, or None when a full reload is needed.
+def _append_rows(csv_path, entry, stat):
+    size, mtime_ns = stat
+    covered = entry['stat'][0]
+    if size <= covered:
+        return None
+
+    edge, on_line_break = edge_hash(csv_path, covered)
+    if edge != entry['edge'] or not on_line_break:
+        return None
+
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        f.seek(covered)
+        tail = f.read(size - covered)
+
+    # A row that is still being written is left for the next call
+    tail = tail[:tail.rfind(b'\n') + 1]
+    if not tail:
+        return entry
+
+    new_rows = clean_orders(read_orders_csv(io.BytesIO(header + tail)), dimensions_for(csv_path))
+    if list(new_rows.columns) != list(entry['orders'].columns):
+        return None
+
+    df_orders = append_orders(entry['orders'], new_rows)
+    derived = {name: structure.extended(new_rows) for name, structure in entry['derived'].items()
+               if hasattr(structure, 'extended')}
+
+    # The version is the file_hash of all covered bytes whatever the appends were,
+    # continued from the previous bytes' hash (hashed once after a snapshot load)
+    digest = entry['digest'] or file_digest(csv_path, covered)
+    digest = digest.copy()
+    digest.update(tail)
+    covered += len(tail)
+    edge = edge_hash(csv_path, covered)[0]
+    covered_stat = (covered, mtime_ns if covered == size else None)
+    new_entry = _entry(covered_stat, edge, digest.hexdigest(), df_orders, entry['snapshot_size'], derived, digest)
+
+    # Fold the appended rows into the snapshot once they are a sizeable share of it
+    if covered - entry['snapshot_size'] > SNAPSHOT_REFRESH_FRACTION * entry['snapshot_size']:
+        _save_snapshot(csv_path, new_entry, new_entry['hash'])
+    return new_entry
+
+
+# Load the cleaned orders frame, parsing the CSV at most once per file version (and
+# normalization rules) and only the appended bytes when the export grew.
+# The returned frame is shared between reruns and sessions: treat it as read-only.
+def load_orders(csv_path='Orders.csv'):
+    key = os.path.abspath(csv_path)
+    stat = file_stat(csv_path)
+    rules = rules_version()
+
+    with _orders_lock:
+        entry = _orders_cache.get(key)
+        if entry is not None and entry['rules'] != rules:
+            entry = None
+        if entry is not None and entry['stat'] == stat:
+            return entry['orders']
+
+        if entry is None:
+            entry = _load_snapshot(csv_path, stat)
+        if entry is not None and entry['stat'] != stat:
+            entry = _append_rows(csv_path, entry, stat)
+        if entry is None:
+            entry = _build_orders(csv_path, stat)
+
+        entry['rules'] = rules
+        _orders_cache[key] = entry
+        return entry['orders']
+
+
+# Structure derived from the orders frame (cube, index, ...), built by build(df_orders)
+# once per dataset version and dropped together with it when Orders.csv changes
+def load_derived(name, build, csv_path='Orders.csv'):
+    with _orders_lock:
+        df_orders = load_orders(csv_path)
+        derived = _orders_cache[os.path.abspath(csv_path)]['derived']
+        if name not in derived:
+            derived[name] = build(df_orders)
+        return derived[name]
+
+
+# Version id of the currently cached dataset (changes whenever the CSV content or the
+# normalization rules do)
+def dataset_version(csv_path='Orders.csv'):
+    load_orders(csv_path)
+    entry = _orders_cache[os.path.abspath(csv_path)]
+    return hashlib.blake2b(f"{entry['hash']}:{entry['rules']}".encode(), digest_size=16).hexdigest()
+
+
+if __name__ == '__main__':
+    print(memory_report(sys.argv[1] if len(sys.argv) > 1 else 'Orders.csv'))
@@ -0,0 +1,164 @@
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from analytics import matrix_frame, matrix_inputs, product_period_matrix
+
+
+# Worker processes building the product x period matrix; 0 (the default) builds it in
+# the dashboard process. Only selections with at least PARALLEL_MIN_ROWS bucketed
+# rows are sent to the pool, smaller ones cost more to hand over than to compute.
+MATRIX_WORKERS = int(os.environ.get('ORDERS_MATRIX_WORKERS', '0'))
+PARALLEL_MIN_ROWS = int(os.environ.get('ORDERS_MATRIX_PARALLEL_ROWS', '1000000'))
+
+# Pools by number of workers, started on first use and kept for the process. Workers
+# are spawned rather than forked, the Streamlit server runs sessions in threads.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(workers=None):
+    workers = workers or MATRIX_WORKERS
+    with _pools_lock:
+        if workers not in _pools:
+            pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            try:
+                _start_workers(pool, workers)
+            except BaseException:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            _pools[workers] = pool
+        return _pools[workers]
+
+
+# Drop a pool a worker of which died (killed for memory, crashed): an executor stays
+# broken for good, the next get_pool starts a new one
+def discard_pool(pool):
+    with _pools_lock:
+        for workers, cached in list(_pools.items()):
+            if cached is pool:
+                del _pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Start every worker of a new pool. Streamlit runs the dashboard script as the
+# __main__ module, which spawned processes import again (running the script), so the
+# workers are started while __main__ is a bare module.
+def _start_workers(pool, workers):
+    main = sys.modules['__main__']
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        started = [pool.submit(os.getpid) for _ in range(workers)]
+    finally:
+        sys.modules['__main__'] = main
+    for future in started:
+        future.result()
+
+
+@atexit.register
+def shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
+
+
+# An array in a new shared memory block, described by (name, shape, dtype) for workers
+def _shared_array(shape, dtype, blocks):
+    dtype = np.dtype(dtype)
+    block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    blocks.append(block)
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf), (block.name, shape, dtype.str)
+
+
+def _attach(spec, blocks):
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    blocks.append(block)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+# Worker: scatter-add the rows of one shard (rows [row_start, row_end) of the inputs,
+# all of products [code_start, code_end)) into those products' rows of the output
+def _fill_shard(inputs, output, row_start, row_end, code_start, code_end):
+    blocks = []
+    try:
+        codes, columns, values = (_attach(spec, blocks) for spec in inputs)
+        matrix = _attach(output, blocks)
+        num_labels = matrix.shape[1]
+        cells = np.bincount((codes[row_start:row_end] - code_start) * num_labels + columns[row_start:row_end],
+                            weights=values[row_start:row_end], minlength=(code_end - code_start) * num_labels)
+        matrix[code_start:code_end] = cells.reshape(code_end - code_start, num_labels)
+        del codes, columns, values, matrix
+    finally:
+        for block in blocks:
+            block.close()
+
+
+# product_period_matrix over a process pool. Products are split into one contiguous
+# range of codes per worker, balanced by row count; rows are grouped by shard in the
+# parent (a radix sort on the shard number) and written once into shared memory along
+# with the output matrix, so workers read their slice and fill their own rows without
+# any frame being pickled. The result is the same table as product_period_matrix,
+# which also builds it when the pool breaks.
+def product_period_matrix_parallel(bucketed, ranges, measure='Quantity', workers=None):
+    workers = workers or MATRIX_WORKERS
+    labels, product_names, product_codes, columns, values = matrix_inputs(bucketed, ranges, measure)
+    num_products, num_labels = len(product_names), len(labels)
+    if workers < 2 or num_products < 2:
+        return product_period_matrix(bucketed, ranges, measure)
+
+    # Shard boundaries: first product code of every shard, by cumulative row count
+    rows_per_product = np.bincount(product_codes, minlength=num_products)
+    targets = np.arange(1, workers) * (len(product_codes) / workers)
+    bounds = np.unique(np.concatenate([[0], np.searchsorted(np.cumsum(rows_per_product), targets, side='right'),
+                                       [num_products]]))
+    shard_of_row = (np.searchsorted(bounds, product_codes, side='right') - 1).astype(np.int16)
+    order = np.argsort(shard_of_row, kind='stable')
+    row_bounds = np.concatenate([[0], np.cumsum(np.bincount(shard_of_row, minlength=len(bounds) - 1))])
+
+    blocks = []
+    pool = matrix = None
+    try:
+        inputs = []
+        for array, dtype in ((product_codes, np.int64), (columns, np.int64), (values, np.float64)):
+            shared, spec = _shared_array(array.shape, dtype, blocks)
+            shared[:] = array[order]
+            inputs.append(spec)
+            del shared
+        shared, output = _shared_array((num_products, num_labels), np.float64, blocks)
+
+        try:
+            pool = get_pool(workers)
+            futures = [pool.submit(_fill_shard, inputs, output, int(row_bounds[i]), int(row_bounds[i + 1]),
+                                   int(bounds[i]), int(bounds[i + 1]))
+                       for i in range(len(bounds) - 1)]
+            for future in futures:
+                future.result()
+            matrix = shared.astype(np.int64 if np.issubdtype(values.dtype, np.integer) else np.float64)
+        except BrokenProcessPool:
+            if pool is not None:
+                discard_pool(pool)
+        del shared
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    if matrix is None:
+        return product_period_matrix(bucketed, ranges, measure)
+    return matrix_frame(matrix, product_names, labels, measure)
+
+
+# The matrix builder for a selection of this size
+def build_product_matrix(bucketed, ranges, measure='Quantity'):
+    if MATRIX_WORKERS > 1 and len(bucketed) >= PARALLEL_MIN_ROWS:
+        return product_period_matrix_parallel(bucketed, ranges, measure)
+    return product_period_matrix(bucketed, ranges, measure)
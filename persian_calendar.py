@@ -0,0 +1,163 @@
+from datetime import date, datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from convertdate import persian
+
+
+# date(1970, 1, 1).toordinal(): shifts day ordinals onto numpy's datetime64 epoch
+EPOCH_ORDINAL = 719163
+
+# Persian weeks start on Saturday (date.weekday() == 5)
+SATURDAY = 5
+
+
+# Day ordinal of 1 Farvardin (Persian new year) for a Persian year.
+# convertdate works astronomically and is slow per call, so everything below
+# is derived from one cached call per Persian year.
+@lru_cache(maxsize=None)
+def farvardin_first(year):
+    return date(*persian.to_gregorian(year, 1, 1)).toordinal()
+
+
+# Day of the Persian year: the first six months have 31 days, the next five 30
+def persian_day_of_year(month, day):
+    month = np.asarray(month)
+    return np.where(month <= 6, (month - 1) * 31, 186 + (month - 7) * 30) + np.asarray(day)
+
+
+# Inverse of persian_day_of_year
+def persian_month_day(day_of_year):
+    day_of_year = np.asarray(day_of_year)
+    first_half = day_of_year <= 186
+    month = np.where(first_half, (day_of_year - 1) // 31 + 1, (day_of_year - 187) // 30 + 7)
+    day = np.where(first_half, (day_of_year - 1) % 31 + 1, (day_of_year - 187) % 30 + 1)
+    return month, day
+
+
+def persian_year_of(ordinal):
+    year = date.fromordinal(int(ordinal)).year - 621
+    return year if ordinal >= farvardin_first(year) else year - 1
+
+
+# Single conversions, used for the handful of dates that fall outside a calendar
+def persian_string_to_ordinal(persian_date_str):
+    year, month, day = map(int, persian_date_str.split('-'))
+    return int(farvardin_first(year) + persian_day_of_year(month, day) - 1)
+
+
+def ordinal_to_persian_string(ordinal):
+    year = persian_year_of(ordinal)
+    month, day = persian_month_day(int(ordinal) - farvardin_first(year) + 1)
+    return f'{year:04}-{int(month):02}-{int(day):02}'
+
+
+# Calendar dimension: one row per day between two day ordinals (inclusive).
+# Persian date strings sort in the same order as the days they name, so both
+# directions of the conversion are plain array lookups.
+class PersianCalendar:
+    def __init__(self, first_ordinal, last_ordinal):
+        self.first_ordinal = int(first_ordinal)
+        self.last_ordinal = int(last_ordinal)
+
+        ordinals = np.arange(self.first_ordinal, self.last_ordinal + 1, dtype=np.int32)
+
+        # New-year ordinals for every Persian year in the span, then month/day arithmetic
+        year_range = np.arange(persian_year_of(self.first_ordinal), persian_year_of(self.last_ordinal) + 1)
+        new_years = np.array([farvardin_first(int(year)) for year in year_range])
+        year_index = np.searchsorted(new_years, ordinals, side='right') - 1
+        years = year_range[year_index]
+        day_of_year = ordinals - new_years[year_index] + 1
+        months, days = persian_month_day(day_of_year)
+
+        # Week of the Persian year, weeks starting on Saturday
+        first_of_year = ordinals - day_of_year + 1
+        first_weekday_offset = (first_of_year + 6 - SATURDAY) % 7
+        weeks = (day_of_year - 1 + first_weekday_offset) // 7 + 1
+
+        self.persian = np.array([f'{y:04}-{m:02}-{d:02}' for y, m, d in zip(years, months, days)], dtype=object)
+        self.table = pd.DataFrame({
+            'Day_Ordinal': ordinals,
+            'Date_Formatted': self.persian,
+            'Gregorian_Date': (ordinals - EPOCH_ORDINAL).astype('datetime64[D]'),
+            'Persian_Year': years.astype(np.int16),
+            'Persian_Month': months.astype(np.int8),
+            'Persian_Day': days.astype(np.int8),
+            'Persian_Week': weeks.astype(np.int8),
+        })
+
+    def __len__(self):
+        return len(self.persian)
+
+    def covers(self, ordinal):
+        return self.first_ordinal <= ordinal <= self.last_ordinal
+
+    # Persian 'YYYY-MM-DD' strings -> int32 day ordinals, one lookup per distinct date
+    def to_ordinal(self, persian_dates):
+        if isinstance(persian_dates, str):
+            return int(self.to_ordinal([persian_dates])[0])
+
+        codes, uniques = pd.factorize(np.asarray(persian_dates, dtype=object))
+        uniques = np.asarray(uniques, dtype=object)
+        positions = np.searchsorted(self.persian, uniques)
+        positions = np.minimum(positions, len(self.persian) - 1)
+        found = self.persian[positions] == uniques
+
+        unique_ordinals = (positions + self.first_ordinal).astype(np.int32)
+        for i in np.flatnonzero(~found):
+            unique_ordinals[i] = persian_string_to_ordinal(uniques[i])
+        return unique_ordinals[codes]
+
+    # Day ordinals -> Persian 'YYYY-MM-DD' strings
+    def to_persian(self, ordinals):
+        if np.isscalar(ordinals):
+            return self.to_persian(np.array([ordinals]))[0]
+
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        inside = (ordinals >= self.first_ordinal) & (ordinals <= self.last_ordinal)
+        if inside.all():
+            return self.persian[ordinals - self.first_ordinal]
+
+        result = np.empty(len(ordinals), dtype=object)
+        result[inside] = self.persian[ordinals[inside] - self.first_ordinal]
+        outside = ordinals[~inside]
+        uniques, inverse = np.unique(outside, return_inverse=True)
+        result[~inside] = np.array([ordinal_to_persian_string(o) for o in uniques], dtype=object)[inverse]
+        return result
+
+    # Day ordinals -> datetime64[D]
+    def to_gregorian(self, ordinals):
+        return (np.asarray(ordinals, dtype=np.int64) - EPOCH_ORDINAL).astype('datetime64[D]')
+
+    # Calendar attributes for every row, joined by day ordinal
+    def attributes(self, ordinals, columns=('Persian_Year', 'Persian_Month', 'Persian_Week')):
+        positions = np.asarray(ordinals, dtype=np.int64) - self.first_ordinal
+        return self.table.iloc[positions][list(columns)].reset_index(drop=True)
+
+
+@lru_cache(maxsize=8)
+def _calendar(first_ordinal, last_ordinal):
+    return PersianCalendar(first_ordinal, last_ordinal)
+
+
+# Calendar covering the given Persian dates plus padding_days on each side.
+# Built from the distinct dates only and cached per span.
+def build_calendar(persian_dates, padding_days=366):
+    uniques = pd.unique(np.asarray(persian_dates, dtype=object))
+    first = persian_string_to_ordinal(min(uniques))
+    last = persian_string_to_ordinal(max(uniques))
+    return _calendar(first - padding_days, last + padding_days)
+
+
+# Calendar covering the given day ordinals plus padding_days on each side
+def calendar_for_ordinals(day_ordinals, padding_days=366):
+    day_ordinals = np.asarray(day_ordinals)
+    return _calendar(int(day_ordinals.min()) - padding_days, int(day_ordinals.max()) + padding_days)
+
+
+# Convert a date/datetime from a widget to a day ordinal
+def to_day_ordinal(gregorian_date):
+    if isinstance(gregorian_date, datetime):
+        gregorian_date = gregorian_date.date()
+    return gregorian_date.toordinal()
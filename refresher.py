@@ -0,0 +1,147 @@
+import itertools
+import os
+import threading
+import time
+
+from data_sources import ORDERS_DB, ORDERS_SQLITE, open_source
+from dimensions import rules_version
+from orders_data import file_stat
+from persian_calendar import build_calendar
+
+
+# Seconds between two checks of the orders source by the background refresher. Reruns
+# are served the last loaded snapshot and never wait for a reload; 0 checks (and
+# reloads) on the rerun itself instead.
+REFRESH_SECONDS = float(os.environ.get('ORDERS_REFRESH_SECONDS', '10'))
+
+# Loads retried when the source changed while it was being loaded
+BUILD_ATTEMPTS = 3
+
+# Numbers snapshots in the order they are built
+_snapshot_sequence = itertools.count(1)
+
+# Refreshers by source, one thread each, shared by every session of the process
+_refreshers = {}
+_refreshers_lock = threading.Lock()
+
+
+# Identity of the source's current content: the CSV's size and mtime with the alias
+# rules its names are normalized with, or the database's version
+def source_signature(csv_path='Orders.csv'):
+    if ORDERS_DB or ORDERS_SQLITE:
+        return open_source(csv_path).version()
+    return file_stat(csv_path), rules_version()
+
+
+# The source changed during every one of BUILD_ATTEMPTS loads
+class SourceChanged(RuntimeError):
+    pass
+
+
+# One loaded version of the orders: the source with its aggregates built, the
+# version id results are cached under, and the categories, dates and calendar the
+# widgets need. Never modified after it is built; sequence orders it among the
+# snapshots of the process.
+class Snapshot:
+    def __init__(self, source, signature, version, categories, dates, calendar):
+        self.sequence = next(_snapshot_sequence)
+        self.source = source
+        self.signature = signature
+        self.version = version
+        self.categories = categories
+        self.dates = dates
+        self.calendar = calendar
+        self.loaded_at = time.time()
+
+    # Load the source; a load the source changed under is done again, so the version
+    # id always matches the data loaded. Raises SourceChanged rather than return a
+    # snapshot whose version may describe other rows than its aggregates.
+    @classmethod
+    def build(cls, csv_path='Orders.csv'):
+        for _ in range(BUILD_ATTEMPTS):
+            signature = source_signature(csv_path)
+            source = open_source(csv_path)
+            version = source.version()
+            dates = list(source.dates())
+            categories = source.categories()
+            if source_signature(csv_path) == signature:
+                return cls(source, signature, version, categories, dates, build_calendar(dates))
+        raise SourceChanged(f'{csv_path} changed during each of {BUILD_ATTEMPTS} loads')
+
+    def to_dict(self):
+        return {'version': self.version, 'age_seconds': round(time.time() - self.loaded_at, 1),
+                'days': len(self.dates)}
+
+
+# Keeps the snapshot of a source current from a background thread. A new snapshot is
+# only built once the source has stopped changing for one interval (an export being
+# written is not read half way), then swapped in with a single assignment, so a rerun
+# sees either the old snapshot or the complete new one.
+class SnapshotRefresher:
+    def __init__(self, csv_path='Orders.csv', interval=REFRESH_SECONDS):
+        self.csv_path = csv_path
+        self.interval = interval
+        self.current = None
+        self.refreshes = 0
+        self.error = None
+        self.build_lock = threading.Lock()
+        self.thread_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    # The current snapshot. Only the first call of the process (or every call with
+    # a 0 interval) waits for a load.
+    def snapshot(self):
+        if self.interval <= 0 or self.current is None:
+            try:
+                self.refresh()
+            except SourceChanged as exc:
+                # Keep serving the last snapshot; the next call loads again
+                if self.current is None:
+                    raise
+                self.error = exc
+        if self.interval > 0:
+            self.start()
+        return self.current
+
+    # Build and swap in a new snapshot if the source changed; True when swapped
+    def refresh(self):
+        with self.build_lock:
+            current = self.current
+            if current is not None and source_signature(self.csv_path) == current.signature:
+                return False
+            snapshot = Snapshot.build(self.csv_path)
+            self.current = snapshot
+            self.refreshes += 1
+            return True
+
+    def start(self):
+        with self.thread_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='orders-refresher', daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        seen = None
+        while not self.stopped.wait(self.interval):
+            try:
+                signature = source_signature(self.csv_path)
+                # Reload once the change has settled: same signature as the last check
+                if signature != self.current.signature and signature == seen:
+                    self.refresh()
+                seen = signature
+                self.error = None
+            except Exception as exc:
+                # Keep serving the last snapshot; try again next interval
+                self.error = exc
+
+
+def get_refresher(csv_path='Orders.csv', interval=REFRESH_SECONDS):
+    key = os.path.abspath(csv_path)
+    with _refreshers_lock:
+        if key not in _refreshers:
+            _refreshers[key] = SnapshotRefresher(csv_path, interval)
+        return _refreshers[key]
@@ -0,0 +1,161 @@
+import argparse
+import io
+
+import pandas as pd
+
+from engine import TrackingReport
+
+
+# Export of a report's tables (period KPIs, per-period totals, daily quantities, the
+# product x period matrix) as CSV, Parquet or Arrow IPC, written chunk by chunk from
+# the report's own frames: no converted copy of a whole table is built, only one
+# chunk at a time.
+#
+#     python report_export.py reports/<version>/<report key> --table matrix --format Parquet --out matrix.parquet
+
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+}
+EXPORT_TABLES = ('kpis', 'periods', 'daily', 'matrix')
+
+# Rows converted and written at a time (one Parquet row group / Arrow record batch)
+EXPORT_CHUNK_ROWS = 50_000
+
+
+# Current and previous range totals and growth of every measure
+def kpi_frame(comparison):
+    measures = list(comparison.current)
+    return pd.DataFrame({
+        'Measure': measures,
+        'Current': [comparison.current[measure] for measure in measures],
+        'Previous': [comparison.previous[measure] for measure in measures],
+        'Growth_Percent': [comparison.growth[measure] for measure in measures],
+        'Start_Ordinal': comparison.start_ordinal,
+        'End_Ordinal': comparison.end_ordinal,
+    })
+
+
+# A table of a report, or None when the report has none (no product matrix)
+def report_table(report, name):
+    if name == 'kpis':
+        return kpi_frame(report.comparison)
+    if name == 'periods':
+        return report.segments
+    if name == 'daily':
+        # The days of the report's window
+        first, last = report.ranges['Start_Persian'].iat[-1], report.ranges['End_Persian'].iat[0]
+        dates = report.daily['Date_Formatted']
+        return report.daily[(dates >= first) & (dates <= last)]
+    if name == 'matrix':
+        return report.matrix.table
+    raise ValueError(f'unknown table: {name}')
+
+
+def export_file_name(name, fmt):
+    return f'{name}.{EXPORT_FORMATS[fmt][0]}'
+
+
+# Bytes written to it since the last drain
+class _DrainBuffer(io.RawIOBase):
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _chunks(frame, chunk_rows):
+    for start in range(0, max(len(frame), 1), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows]
+
+
+# The file of a table in a format, as a generator of byte chunks
+def iter_export(frame, fmt='CSV', chunk_rows=EXPORT_CHUNK_ROWS):
+    if fmt == 'CSV':
+        # With a byte order mark, so spreadsheet programs read the Persian text as UTF-8
+        yield '\ufeff'.encode('utf-8')
+        for i, chunk in enumerate(_chunks(frame, chunk_rows)):
+            yield chunk.to_csv(index=False, header=i == 0).encode('utf-8')
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(frame.iloc[:chunk_rows], preserve_index=False)
+    sink = _DrainBuffer()
+    if fmt == 'Parquet':
+        writer = pq.ParquetWriter(sink, schema)
+        write = writer.write_table
+    elif fmt == 'Arrow':
+        writer = pa.ipc.new_file(sink, schema)
+        write = writer.write_table
+    else:
+        raise ValueError(f'unknown format: {fmt}')
+
+    with writer:
+        for chunk in _chunks(frame, chunk_rows):
+            write(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+# The same as a readable file object, for APIs that take files
+class ExportStream(io.RawIOBase):
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            self.pending = next(self.chunks, None)
+            if self.pending is None:
+                self.pending = b''
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def export_stream(frame, fmt='CSV', chunk_rows=EXPORT_CHUNK_ROWS):
+    return io.BufferedReader(ExportStream(iter_export(frame, fmt, chunk_rows)))
+
+
+def write_export(frame, path, fmt='CSV', chunk_rows=EXPORT_CHUNK_ROWS):
+    with open(path, 'wb') as f:
+        for data in iter_export(frame, fmt, chunk_rows):
+            f.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a table of a precomputed report')
+    parser.add_argument('report', help='report directory written by batch_reports.py')
+    parser.add_argument('--table', choices=EXPORT_TABLES, default='matrix')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='CSV')
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args()
+
+    frame = report_table(TrackingReport.load(args.report), args.table)
+    if frame is None:
+        parser.error(f'the report has no {args.table} table')
+    out = args.out or export_file_name(args.table, args.format)
+    write_export(frame, out, args.format)
+    print(f'{len(frame):,} rows written to {out}')
+
+
+if __name__ == '__main__':
+    main()
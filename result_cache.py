@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+# Memory the shared result cache may hold
+REPORT_CACHE_BYTES = int(float(os.environ.get('ORDERS_REPORT_CACHE_MB', '256')) * (1 << 20))
+
+
+# Approximate memory held by a result (results holding tables report it themselves)
+def result_bytes(value):
+    if hasattr(value, 'memory_bytes'):
+        return value.memory_bytes()
+    return 1024
+
+
+# A computation in progress. Callers of the same key wait for it instead of
+# computing the same result again.
+class _Pending:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.ok = False
+
+
+# Results shared by every session of the process, keyed by (kind, dataset version,
+# filter state...). Least recently used entries are evicted beyond max_bytes, and
+# moving to a new version drops every entry of the older ones.
+class ResultCache:
+    def __init__(self, max_bytes=REPORT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.version = None
+        self.sequence = None
+        self.size = 0
+        self.pending = {}
+        self.hits = self.misses = self.waits = self.evictions = self.invalidations = 0
+        self.lock = threading.Lock()
+
+    # Concurrent misses on a key are computed once: the first caller computes, the
+    # others wait and are handed its result (or, if it raised, try again themselves)
+    def get_or_compute(self, key, compute):
+        while True:
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return self.entries[key][0]
+                pending = self.pending.get(key)
+                if pending is None:
+                    pending = self.pending[key] = _Pending()
+                    self.misses += 1
+                    break
+                self.waits += 1
+            pending.done.wait()
+            if pending.ok:
+                return pending.value
+
+        try:
+            value = compute()
+            pending.value, pending.ok = value, True
+            self.put(key, value)
+        finally:
+            with self.lock:
+                del self.pending[key]
+            pending.done.set()
+        return value
+
+    def _switch(self, version):
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self.size = 0
+            self.version = version
+
+    # Make the version of a snapshot current, unless a later snapshot (higher
+    # sequence) already did: a rerun that started on the snapshot the refresher has
+    # since replaced cannot move the cache back to it
+    def advance(self, version, sequence):
+        with self.lock:
+            if self.sequence is None or sequence >= self.sequence:
+                self._switch(version)
+                self.sequence = sequence
+
+    # Results of another version than the current one are not stored once advance has
+    # been called (they belong to a replaced snapshot); before that, storing a result
+    # of a new version makes it current
+    def put(self, key, value):
+        nbytes = result_bytes(value)
+        with self.lock:
+            version = key[1]
+            if version != self.version:
+                if self.sequence is not None:
+                    return
+                self._switch(version)
+            if nbytes > self.max_bytes:
+                return
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (value, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.size -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.version = None
+            self.sequence = None
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses,
+                    'waits': self.waits, 'evictions': self.evictions, 'invalidations': self.invalidations}
+
+
+# Reports and KPI comparisons of the tracking page
+report_cache = ResultCache()
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+from daily_cube import CELL_COLUMNS, MEASURES, ORDER_ROWS, DailyCube, build_cube_streaming
+from dimensions import rules_version
+from orders_data import STREAM_CHUNK_ROWS, file_stat
+from persian_calendar import calendar_for_ordinals
+
+
+# Directory the daily cube is published to as memory-mapped files. When set, every
+# dashboard process maps the cube of the current Orders.csv from there (building and
+# publishing it if no process has yet), so sessions and processes read the same pages
+# of the page cache instead of each holding the orders and the cube in its own memory.
+SHARED_DIR = os.environ.get('ORDERS_SHARED_DIR') or None
+
+# Changes whenever the files' layout does, so old publications are not mapped
+LAYOUT_VERSION = '1'
+
+# Name of a publication directory: <file_version>-<layout>
+PUBLICATION_PATTERN = re.compile(r'[0-9a-f]{32}-[0-9A-Za-z]+')
+
+# Times a publication removed while it was being opened is looked up again
+OPEN_ATTEMPTS = 3
+
+# Chunk size of the streamed build of a cube to publish
+PUBLISH_CHUNK_ROWS = STREAM_CHUNK_ROWS or 500_000
+
+# Mapped cubes per CSV path with the version they were mapped for
+_mapped_cubes = {}
+_mapped_lock = threading.Lock()
+
+
+# Version of Orders.csv by its size and mtime (and the rules its names are normalized
+# with), known without reading it
+def file_version(csv_path='Orders.csv'):
+    return hashlib.blake2b(repr((file_stat(csv_path), rules_version())).encode(), digest_size=16).hexdigest()
+
+
+# Write a cube as one .npy file per array (frame columns, categorical codes, days,
+# daily and prefix arrays) and its categories and products in cube.json. Written to
+# a staging directory and renamed into place, so a half-written cube is never mapped.
+def publish_cube(cube, path):
+    staging = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    arrays = {f'frame_{column}': cube.frame[column].to_numpy() for column in CELL_COLUMNS}
+    arrays['codes_Category'] = cube.frame['Category'].array.codes
+    arrays['codes_ProductName'] = cube.frame['ProductName'].array.codes
+    arrays['days'] = cube.days
+    for measure in MEASURES + (ORDER_ROWS,):
+        arrays[f'daily_{measure}'] = cube.daily[measure]
+        arrays[f'prefix_{measure}'] = cube.prefix[measure]
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, f'{name}.npy'), np.ascontiguousarray(array))
+
+    meta = {'layout': LAYOUT_VERSION, 'first_ordinal': int(cube.first_ordinal), 'num_days': int(cube.num_days),
+            'categories': cube.categories.tolist(), 'products': cube.products.tolist()}
+    with open(os.path.join(staging, 'cube.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    try:
+        os.replace(staging, path)
+    except OSError:
+        # Another process published the same version first
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+# The cube published at path, on read-only memory maps of its files: no array is
+# read into memory, the frame's columns are views of the mapped pages
+def open_cube(path):
+    def mapped(name):
+        return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r').view(np.ndarray)
+
+    with open(os.path.join(path, 'cube.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+
+    cube = DailyCube()
+    cube.categories = cube.categories.append(pd.Index(meta['categories'], dtype=object))
+    cube.products = cube.products.append(pd.Index(meta['products'], dtype=object))
+    columns = {column: mapped(f'frame_{column}') for column in CELL_COLUMNS}
+    columns['Category'] = pd.Categorical.from_codes(mapped('codes_Category'), categories=cube.categories)
+    columns['ProductName'] = pd.Categorical.from_codes(mapped('codes_ProductName'), categories=cube.products)
+    cube.frame = pd.DataFrame(columns, copy=False)
+    cube.days = mapped('days')
+    cube.dates = calendar_for_ordinals(cube.days).to_persian(cube.days)
+    cube.first_ordinal, cube.num_days = meta['first_ordinal'], meta['num_days']
+    for measure in MEASURES + (ORDER_ROWS,):
+        cube.daily[measure] = mapped(f'daily_{measure}')
+        cube.prefix[measure] = mapped(f'prefix_{measure}')
+    return cube
+
+
+# Drop the publications of other versions (and layouts). Only directories named like
+# a publication are touched; processes still mapping them keep their pages until
+# they move on.
+def remove_stale_publications(shared_dir, current):
+    for name in os.listdir(shared_dir):
+        if name != current and PUBLICATION_PATTERN.fullmatch(name):
+            shutil.rmtree(os.path.join(shared_dir, name), ignore_errors=True)
+
+
+# The cube of the current Orders.csv, mapped from shared_dir. The first process to
+# need a version builds it (streaming the CSV, so the order lines are never all in
+# memory) and publishes it, removing older versions. A publication removed while it
+# is opened (a newer version was published meanwhile) is looked up again; if that
+# keeps happening, the cube is built in memory for this call.
+def shared_cube(csv_path='Orders.csv', shared_dir=SHARED_DIR):
+    key = os.path.abspath(csv_path)
+    with _mapped_lock:
+        for _ in range(OPEN_ATTEMPTS):
+            version = file_version(csv_path)
+            cached = _mapped_cubes.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+
+            path = os.path.join(shared_dir, f'{version}-{LAYOUT_VERSION}')
+            if not os.path.exists(os.path.join(path, 'cube.json')):
+                cube = build_cube_streaming(csv_path, PUBLISH_CHUNK_ROWS, progress=None)
+                if file_version(csv_path) != version:
+                    # Written to while it was read: serve this cube, publish the next one
+                    return cube
+                os.makedirs(shared_dir, exist_ok=True)
+                publish_cube(cube, path)
+                remove_stale_publications(shared_dir, os.path.basename(path))
+
+            try:
+                cube = open_cube(path)
+            except FileNotFoundError:
+                continue
+            _mapped_cubes[key] = (version, cube)
+            return cube
+
+        return build_cube_streaming(csv_path, PUBLISH_CHUNK_ROWS, progress=None)
@@ -0,0 +1,92 @@
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from persian_calendar import calendar_for_ordinals
+
+
+# Building blocks for Persian category/product names
+CATEGORIES = ['گوشی موبایل', 'لپ تاپ', 'تبلت', 'هدفون', 'ساعت هوشمند', 'لوازم جانبی', 'کنسول بازی', 'دوربین']
+BRANDS = ['سامسونگ', 'شیائومی', 'اپل', 'هوآوی', 'نوکیا', 'لنوو', 'ایسوس', 'سونی', 'انکر', 'شیائومی پوکو']
+VARIANTS = ['مدل', 'سری', 'نسخه']
+
+ROWS_PER_CHUNK = 1_000_000
+
+
+# Product dimension: name, category and unit price of every synthetic product
+def make_products(num_products, rng):
+    brands = rng.integers(0, len(BRANDS), num_products)
+    variants = rng.integers(0, len(VARIANTS), num_products)
+    names = [f'{BRANDS[b]} {VARIANTS[v]} {i}' for i, (b, v) in enumerate(zip(brands, variants))]
+    categories = rng.integers(0, len(CATEGORIES), num_products)
+    prices = (rng.lognormal(mean=17, sigma=1, size=num_products) // 10_000 * 10_000).astype(np.int64) + 10_000
+    return pd.DataFrame({'ProductName': names, 'Category': np.asarray(CATEGORIES)[categories], 'Price': prices})
+
+
+# One chunk of order lines over the day positions [first_day, last_day) of the span.
+# Days are sorted, like an export that is appended to day by day.
+def make_chunk(num_rows, first_day, last_day, products, calendar, first_ordinal, rng, missing_date_rate):
+    days = np.sort(rng.integers(first_day, max(first_day + 1, last_day), num_rows))
+    dates = calendar.to_persian(first_ordinal + days).astype(object)
+    dates[rng.random(num_rows) < missing_date_rate] = None
+
+    # Popular products sell more often (Zipf-like)
+    product_index = np.minimum(rng.zipf(1.3, num_rows) - 1, len(products) - 1)
+    product_index = rng.permutation(len(products))[product_index]
+    quantity = np.minimum(rng.geometric(0.6, num_rows), 20)
+    total_price = quantity * products['Price'].to_numpy()[product_index]
+    discount = rng.choice([0.0, 0.0, 0.05, 0.1, 0.15], num_rows)
+
+    categories = products['Category'].to_numpy()[product_index].astype(object)
+    # The export writes some mobile phones with a trailing space
+    categories[(categories == 'گوشی موبایل') & (rng.random(num_rows) < 0.1)] = 'گوشی موبایل '
+
+    return pd.DataFrame({
+        'Date_Formatted': dates,
+        'Category': categories,
+        'ProductName': products['ProductName'].to_numpy()[product_index],
+        'Quantity': quantity,
+        'TotalPrice': total_price,
+        'TotalNetPrice': total_price * (1 - discount),
+    })
+
+
+# Write a synthetic Orders.csv with the real export's schema. Generated and written
+# in chunks, so any row count fits in memory.
+def generate_orders(path, num_rows, num_products=5_000, num_days=730, end_date=None, seed=0,
+                    missing_date_rate=0.001):
+    rng = np.random.default_rng(seed)
+    end_ordinal = (end_date or date.today()).toordinal()
+    first_ordinal = end_ordinal - num_days + 1
+    calendar = calendar_for_ordinals([first_ordinal, end_ordinal])
+    products = make_products(num_products, rng)
+
+    num_chunks = max(1, -(-num_rows // ROWS_PER_CHUNK))
+    day_edges = np.linspace(0, num_days, num_chunks + 1).astype(int)
+    row_edges = np.linspace(0, num_rows, num_chunks + 1).astype(int)
+    for i in range(num_chunks):
+        chunk = make_chunk(row_edges[i + 1] - row_edges[i], day_edges[i], day_edges[i + 1],
+                           products, calendar, first_ordinal, rng, missing_date_rate)
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic Orders.csv')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--products', type=int, default=5_000)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='Orders.csv')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generate_orders(args.out, args.rows, args.products, args.days, seed=args.seed)
+    print(f'Wrote {args.rows:,} rows to {args.out} in {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_orders import generate_orders  # noqa: E402
+
+
+# Rows, products and days of the synthetic export the tests run on
+ORDERS_ROWS = 20_000
+ORDERS_PRODUCTS = 300
+ORDERS_DAYS = 180
+ORDERS_END_DATE = date(2024, 6, 1)
+
+
+# A synthetic Orders.csv (with a few dateless rows), written once per session
+@pytest.fixture(scope='session')
+def orders_csv(tmp_path_factory):
+    path = tmp_path_factory.mktemp('orders') / 'Orders.csv'
+    generate_orders(str(path), ORDERS_ROWS, ORDERS_PRODUCTS, ORDERS_DAYS, end_date=ORDERS_END_DATE, seed=1)
+    return str(path)
+
+
+# A copy of the export in a directory of its own, so snapshots, dimension tables and
+# the process-wide caches (keyed by path) start empty
+@pytest.fixture
+def fresh_csv(orders_csv, tmp_path):
+    path = tmp_path / 'Orders.csv'
+    with open(orders_csv, 'rb') as src, open(path, 'wb') as dst:
+        dst.write(src.read())
+    return str(path)
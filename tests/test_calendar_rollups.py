@@ -0,0 +1,68 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calendar_rollups import PERIODS_PER_YEAR, CalendarRollups
+from engine import growth_percent
+from persian_calendar import calendar_for_ordinals
+
+FIRST_ORDINAL = date(2022, 8, 10).toordinal()
+NUM_DAYS = 900
+
+
+@pytest.fixture(scope='module')
+def series():
+    values = np.random.default_rng(5).integers(0, 20, NUM_DAYS)
+    ordinals = np.arange(FIRST_ORDINAL, FIRST_ORDINAL + NUM_DAYS)
+    calendar = calendar_for_ordinals(ordinals)
+    persian_dates = pd.Series(calendar.to_persian(ordinals))
+    periods = pd.DataFrame({
+        'Ordinal': ordinals,
+        'Value': values,
+        'Month': persian_dates.str[:7],
+        'Quarter': persian_dates.str[:4] + '-Q' + ((persian_dates.str[5:7].astype(int) - 1) // 3 + 1).astype(str),
+        'Year': persian_dates.str[:4],
+        # Days since the Saturday starting the week
+        'Week': ordinals - (ordinals - 6) % 7,
+    })
+    return CalendarRollups(FIRST_ORDINAL, values, calendar), periods
+
+
+# Period totals equal a group-by of the days on their Persian week / month / quarter / year
+@pytest.mark.parametrize('granularity', ['Week', 'Month', 'Quarter', 'Year'])
+def test_tables_match_groupby(series, granularity):
+    rollups, periods = series
+    grouped = periods.groupby(granularity, sort=True).agg(
+        Start_Ordinal=('Ordinal', 'min'), End_Ordinal=('Ordinal', 'max'), Days=('Ordinal', 'size'), Total=('Value', 'sum'))
+    table = rollups.tables[granularity]
+    assert table['Total'].tolist() == grouped['Total'].tolist()
+    assert table['Start_Ordinal'].tolist() == grouped['Start_Ordinal'].tolist()
+    assert table['Days'].tolist() == grouped['Days'].tolist()
+    if granularity != 'Week':
+        assert table['Period'].tolist() == grouped.index.tolist()
+
+
+# Month to date against the same first days of the month lag months back (fewer when
+# that month is shorter)
+@pytest.mark.parametrize('lag', [1, PERIODS_PER_YEAR['Month']])
+def test_compare_month_to_date(series, lag):
+    rollups, periods = series
+    months = periods['Month'].drop_duplicates().tolist()
+    for ordinal in range(FIRST_ORDINAL + 400, FIRST_ORDINAL + NUM_DAYS, 13):
+        day = periods[periods['Ordinal'] == ordinal].iloc[0]
+        month_days = periods[periods['Month'] == day['Month']]
+        current = month_days.loc[month_days['Ordinal'] <= ordinal, 'Value'].sum()
+        elapsed = ordinal - month_days['Ordinal'].min()
+        previous_days = periods[periods['Month'] == months[months.index(day['Month']) - lag]]
+        previous = previous_days['Value'].iloc[:elapsed + 1].sum()
+        assert rollups.compare('Month', ordinal, lag) == (current, previous, growth_percent(current, previous))
+
+
+def test_compare_outside_series(series):
+    rollups, _ = series
+    assert rollups.compare('Month', FIRST_ORDINAL - 1) == (0, 0, 0)
+    first_month_day = int(rollups.tables['Month']['Start_Ordinal'].iat[0])
+    current, previous, growth = rollups.compare('Month', first_month_day + 3)
+    assert previous == 0 and growth == 0
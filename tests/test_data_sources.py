@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+
+from data_sources import CubeSource, SqliteOrdersSource
+
+
+@pytest.fixture(scope='module')
+def sources(orders_csv, tmp_path_factory):
+    db_path = tmp_path_factory.mktemp('sqlite') / 'orders.db'
+    return CubeSource(orders_csv), SqliteOrdersSource.import_csv(orders_csv, str(db_path))
+
+
+# The SQL source pushes the same report down into queries: same KPIs, daily
+# quantities, period totals and product table as the cube
+@pytest.mark.parametrize('num_days, num_divisions', [(7, 5), (30, 4)])
+def test_sqlite_report_matches_cube(sources, num_days, num_divisions):
+    cube_source, sql_source = sources
+    calendar = sql_source.calendar()
+    end_ordinal = calendar.to_ordinal(sql_source.dates()[-1])
+    category = cube_source.categories()[0]
+
+    for selected in (None, category):
+        expected = cube_source.report(calendar, end_ordinal - num_days + 1, end_ordinal, num_divisions, selected)
+        actual = sql_source.report(calendar, end_ordinal - num_days + 1, end_ordinal, num_divisions, selected)
+        for measure in expected.comparison.current:
+            assert actual.comparison.current[measure] == pytest.approx(expected.comparison.current[measure])
+            assert actual.comparison.previous[measure] == pytest.approx(expected.comparison.previous[measure])
+        pd.testing.assert_frame_equal(actual.daily, expected.daily, check_dtype=False)
+        pd.testing.assert_frame_equal(actual.segments, expected.segments, check_dtype=False)
+        pd.testing.assert_frame_equal(actual.matrix.table, expected.matrix.table, check_dtype=False)
+
+
+def test_sqlite_categories_match_cube(sources):
+    cube_source, sql_source = sources
+    assert sql_source.categories() == cube_source.categories()
@@ -0,0 +1,45 @@
+import multiprocessing
+
+from dimensions import DimensionTable
+
+
+# Two loads of one table (two processes ingesting the same CSV) adding names: the
+# second takes over the ids the first saved instead of handing them out again
+def test_tables_on_one_path_share_ids(tmp_path):
+    path = str(tmp_path / 'Orders.ProductName.parquet')
+    first, second = DimensionTable.load(path), DimensionTable.load(path)
+
+    assert first.encode(['b', 'a']).tolist() == [1, 0]
+    assert second.encode(['c', 'a']).tolist() == [2, 0]
+    assert first.encode(['c', 'd']).tolist() == [2, 3]
+    assert DimensionTable.load(path).names == ['a', 'b', 'c', 'd']
+    assert second.encode(['d']).tolist() == [3]
+
+
+def _encode_batches(path, worker):
+    table = DimensionTable.load(path)
+    for batch in range(20):
+        table.encode([f'{worker}-{batch}', f'shared-{batch}'])
+
+
+# Processes adding names at the same time never give two names one id
+def test_concurrent_processes(tmp_path):
+    path = str(tmp_path / 'Orders.ProductName.parquet')
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=_encode_batches, args=(path, worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    names = DimensionTable.load(path).names
+    assert sorted(names) == sorted({f'{worker}-{batch}' for worker in range(4) for batch in range(20)}
+                                   | {f'shared-{batch}' for batch in range(20)})
+
+
+# Without a path the ids only live in the table
+def test_table_without_path():
+    table = DimensionTable()
+    assert table.encode(['y', 'x', 'y']).tolist() == [1, 0, 1]
+    assert table.names == ['x', 'y']
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import ProductSeriesStore, growth_percent
+
+
+# Product x period table as product_period_matrix lays it out: newest period first,
+# with many ties so ordering between equal keys is exercised
+@pytest.fixture
+def store():
+    rng = np.random.default_rng(3)
+    values = rng.integers(0, 5, (200, 4))
+    table = pd.DataFrame(values, columns=['P4', 'P3', 'P2', 'P1'])
+    table.insert(0, 'ProductName', [f'Product {i} سامسونگ' if i % 7 == 0 else f'Product {i}' for i in range(200)])
+    table['Total'] = values.sum(axis=1)
+    return ProductSeriesStore(table, 4)
+
+
+# A full sort of every product by the key (best first, ties in table order)
+def _reference(store, key, codes):
+    return sorted(codes, key=lambda code: (-key(code), code))
+
+
+@pytest.mark.parametrize('by', ['Total', 'Max', 'Growth'])
+@pytest.mark.parametrize('k', [None, 0, 1, 10, 57, 500])
+def test_ranked_matches_full_sort(store, by, k):
+    values = store.values
+    keys = {
+        'Total': lambda code: values[code].sum(),
+        'Max': lambda code: values[code].max(),
+        'Growth': lambda code: growth_percent(values[code, -1], values[code, -2]),
+    }
+    expected = _reference(store, keys[by], range(len(store)))
+    assert store.ranked(by, k).tolist() == expected[:k]
+
+    codes = store.search('سامسونگ')
+    assert store.ranked(by, k, codes).tolist() == _reference(store, keys[by], codes.tolist())[:k]
+
+
+def test_series_are_oldest_first(store):
+    assert store.labels == ['P1', 'P2', 'P3', 'P4']
+    assert store.series('Product 5').tolist() == store.table.loc[5, ['P1', 'P2', 'P3', 'P4']].tolist()
+
+
+def test_search(store):
+    assert store.search('').tolist() == list(range(len(store)))
+    assert store.search('PRODUCT 19').tolist() == [19] + list(range(190, 200))
+    assert store.search('سامسونگ').tolist() == list(range(0, 200, 7))
+    assert store.search('nothing').tolist() == []
+
+
+def test_top_and_rows(store):
+    top = store.top(3)
+    assert top == store.products[store.ranked('Total', 3)].tolist()
+    assert store.rows(store.ranked('Total', 3))['ProductName'].tolist() == top
@@ -0,0 +1,61 @@
+import pandas as pd
+
+import orders_data
+from daily_cube import MEASURES, load_cube
+from orders_data import _orders_cache, file_hash, load_orders
+
+
+def _names(df_orders):
+    return df_orders.assign(Category=df_orders['Category'].astype(object),
+                            ProductName=df_orders['ProductName'].astype(object))
+
+
+# Rows appended to the export are parsed on their own and added to the loaded frame
+# and cube; the result (and the version) is the same as loading the whole file again
+def test_append_matches_full_reload(orders_csv, tmp_path, monkeypatch):
+    with open(orders_csv, 'rb') as f:
+        data = f.read()
+    first = data.rindex(b'\n', 0, int(len(data) * 0.5)) + 1
+    second = data.rindex(b'\n', 0, int(len(data) * 0.7)) + 1
+
+    grown = tmp_path / 'grown' / 'Orders.csv'
+    grown.parent.mkdir()
+    grown.write_bytes(data[:first])
+    load_orders(str(grown))
+    load_cube(str(grown), chunk_rows=None)
+
+    # Only the incremental path is left: a full parse would fail the test
+    def no_reload(csv_path, stat):
+        raise AssertionError(f'{csv_path} parsed in full')
+    with monkeypatch.context() as patch:
+        patch.setattr(orders_data, '_build_orders', no_reload)
+        for start, end in ((first, second), (second, len(data))):
+            with open(grown, 'ab') as f:
+                f.write(data[start:end])
+            appended = load_orders(str(grown))
+            appended_cube = load_cube(str(grown), chunk_rows=None)
+    assert _orders_cache[str(grown.resolve())]['hash'] == file_hash(str(grown))
+
+    full = tmp_path / 'full' / 'Orders.csv'
+    full.parent.mkdir()
+    full.write_bytes(data)
+    reloaded = load_orders(str(full))
+    reloaded_cube = load_cube(str(full), chunk_rows=None)
+    assert _orders_cache[str(grown.resolve())]['hash'] == _orders_cache[str(full.resolve())]['hash']
+
+    pd.testing.assert_frame_equal(_names(appended), _names(reloaded), check_dtype=False)
+    assert (appended_cube.first_ordinal, appended_cube.num_days) == (reloaded_cube.first_ordinal, reloaded_cube.num_days)
+    for category in [None] + reloaded_cube.categories.tolist():
+        for measure in MEASURES:
+            expected = reloaded_cube.daily[measure][reloaded_cube._row(category)]
+            assert (appended_cube.daily[measure][appended_cube._row(category)] == expected).all()
+
+
+# Rows without a date (and without measures) are dropped instead of failing the load
+def test_dateless_rows_without_measures(fresh_csv):
+    with open(fresh_csv, 'a', encoding='utf-8') as f:
+        f.write(',تبلت,x,,,\n')
+    raw = pd.read_csv(fresh_csv)
+    df_orders = load_orders(fresh_csv)
+    assert len(df_orders) == raw['Date_Formatted'].notna().sum()
+    assert df_orders['Quantity'].sum() == raw.loc[raw['Date_Formatted'].notna(), 'Quantity'].sum()
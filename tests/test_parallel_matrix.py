@@ -0,0 +1,46 @@
+import os
+import signal
+import time
+
+import pandas as pd
+
+from analytics import bucket_periods, period_ranges, product_period_matrix, ranges_with_data
+from daily_cube import load_cube
+from parallel_matrix import _pools, get_pool, product_period_matrix_parallel
+from persian_calendar import calendar_for_ordinals
+
+
+# The product x period table built over a process pool is the serial one
+def test_parallel_matches_serial(orders_csv):
+    cube = load_cube(orders_csv, chunk_rows=None)
+    end_ordinal = cube.first_ordinal + cube.num_days - 1
+    ranges = period_ranges(calendar_for_ordinals(cube.days), end_ordinal, 14, 10)
+    bucketed = bucket_periods(cube.frame, end_ordinal, 14, 10)
+    filtered = ranges_with_data(cube.frame, ranges)
+
+    serial = product_period_matrix(bucketed, filtered, 'Quantity')
+    parallel = product_period_matrix_parallel(bucketed, filtered, 'Quantity', workers=2)
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+# A pool whose worker died is dropped: the table is built serially, and the next call
+# starts a new pool
+def test_broken_pool_falls_back(orders_csv):
+    cube = load_cube(orders_csv, chunk_rows=None)
+    end_ordinal = cube.first_ordinal + cube.num_days - 1
+    ranges = period_ranges(calendar_for_ordinals(cube.days), end_ordinal, 14, 10)
+    bucketed = bucket_periods(cube.frame, end_ordinal, 14, 10)
+    filtered = ranges_with_data(cube.frame, ranges)
+    serial = product_period_matrix(bucketed, filtered, 'Quantity')
+
+    pool = get_pool(2)
+    os.kill(next(iter(pool._processes)), signal.SIGKILL)
+    # The executor notices the death in its own thread; until then the other worker
+    # could still build every shard
+    deadline = time.monotonic() + 30
+    while not pool._broken and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pd.testing.assert_frame_equal(product_period_matrix_parallel(bucketed, filtered, 'Quantity', workers=2), serial)
+    assert _pools.get(2) is not pool
+    pd.testing.assert_frame_equal(product_period_matrix_parallel(bucketed, filtered, 'Quantity', workers=2), serial)
+    assert _pools.get(2) is not None and _pools[2] is not pool
@@ -0,0 +1,48 @@
+from datetime import date
+
+import numpy as np
+from convertdate import persian
+
+from persian_calendar import PersianCalendar, build_calendar, persian_string_to_ordinal
+
+
+def _reference(ordinal):
+    year, month, day = persian.from_gregorian(*date.fromordinal(ordinal).timetuple()[:3])
+    return f'{year:04}-{month:02}-{day:02}'
+
+
+# Days of a span with two leap years (every 15th day, and every day around each new
+# year) agree with convertdate, both ways
+def test_conversions_match_convertdate():
+    first, last = date(2020, 1, 1).toordinal(), date(2026, 1, 1).toordinal()
+    calendar = PersianCalendar(first, last)
+    new_years = [date(year, 3, 10).toordinal() + np.arange(20) for year in range(2020, 2026)]
+    ordinals = np.unique(np.concatenate([np.arange(first, last + 1, 15)] + new_years))
+    expected = np.array([_reference(ordinal) for ordinal in ordinals], dtype=object)
+    assert (calendar.to_persian(ordinals) == expected).all()
+    assert (calendar.to_ordinal(expected) == ordinals).all()
+
+
+def test_known_dates():
+    calendar = build_calendar(['1403-01-01'])
+    assert calendar.to_ordinal('1403-01-01') == date(2024, 3, 20).toordinal()
+    assert calendar.to_persian(date(2025, 3, 20).toordinal()) == '1403-12-30'
+    assert calendar.to_gregorian([date(2024, 3, 20).toordinal()])[0] == np.datetime64('2024-03-20')
+
+
+# Dates outside the calendar's span are converted one by one, with the same results
+def test_outside_span():
+    calendar = PersianCalendar(date(2024, 1, 1).toordinal(), date(2024, 12, 31).toordinal())
+    ordinals = np.array([date(2010, 5, 5).toordinal(), date(2024, 6, 1).toordinal(), date(2030, 2, 2).toordinal()])
+    persian_dates = calendar.to_persian(ordinals)
+    assert list(persian_dates) == [_reference(int(ordinal)) for ordinal in ordinals]
+    assert (calendar.to_ordinal(persian_dates) == ordinals).all()
+    assert persian_string_to_ordinal(persian_dates[0]) == ordinals[0]
+
+
+# Persian weeks start on Saturday
+def test_weeks_start_on_saturday():
+    calendar = PersianCalendar(date(2024, 3, 20).toordinal(), date(2025, 3, 20).toordinal())
+    table = calendar.table
+    week_starts = table[table['Persian_Week'].diff().fillna(1) != 0]['Day_Ordinal'].iloc[1:]
+    assert all(date.fromordinal(int(ordinal)).weekday() == 5 for ordinal in week_starts)
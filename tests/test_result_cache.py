@@ -0,0 +1,108 @@
+import threading
+import time
+
+from result_cache import ResultCache
+
+
+class Sized:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def memory_bytes(self):
+        return self.nbytes
+
+
+# Concurrent misses on one key compute it once; the other callers get that result
+def test_concurrent_misses_compute_once():
+    cache = ResultCache(max_bytes=1 << 20)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'report'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute(('report', 'v1'), compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == ['report'] * 8
+    assert cache.stats()['misses'] == 1
+
+
+# When the first computation raises, a waiting caller computes the result itself
+def test_failed_computation_is_retried():
+    cache = ResultCache(max_bytes=1 << 20)
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError('source went away')
+
+    errors = []
+
+    def first():
+        try:
+            cache.get_or_compute(('report', 'v1'), failing)
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    started.wait()
+    assert cache.get_or_compute(('report', 'v1'), lambda: 'report') == 'report'
+    thread.join()
+    assert len(errors) == 1
+    assert not cache.pending
+
+
+# Least recently used entries go first once the results exceed max_bytes
+def test_lru_eviction():
+    cache = ResultCache(max_bytes=300)
+    for name in 'abc':
+        cache.put(('report', 'v1', name), Sized(100))
+    cache.get_or_compute(('report', 'v1', 'a'), lambda: None)
+    cache.put(('report', 'v1', 'd'), Sized(100))
+    assert [key[2] for key in cache.entries] == ['c', 'a', 'd']
+    assert cache.stats()['bytes'] == 300
+    assert cache.stats()['evictions'] == 1
+
+    # A result larger than the whole cache is not stored
+    cache.put(('report', 'v1', 'huge'), Sized(301))
+    assert ('report', 'v1', 'huge') not in cache.entries
+
+
+# Moving to a newer snapshot drops the older version's results; a rerun still on the
+# older snapshot neither stores its results nor moves the cache back
+def test_version_invalidation():
+    cache = ResultCache(max_bytes=1 << 20)
+    cache.advance('v1', 1)
+    cache.put(('report', 'v1', 'a'), 'old')
+    cache.advance('v2', 2)
+    assert not cache.entries
+    assert cache.stats()['invalidations'] == 1
+
+    cache.put(('report', 'v2', 'a'), 'new')
+    cache.advance('v1', 1)
+    cache.put(('report', 'v1', 'b'), 'stale')
+    assert cache.version == 'v2'
+    assert list(cache.entries) == [('report', 'v2', 'a')]
+
+    # The same version id coming back with a newer snapshot is cached again
+    cache.advance('v1', 3)
+    cache.put(('report', 'v1', 'c'), 'current')
+    assert list(cache.entries) == [('report', 'v1', 'c')]
+
+
+# Without advance, storing a result of a new version makes it current
+def test_put_switches_version_without_snapshots():
+    cache = ResultCache(max_bytes=1 << 20)
+    cache.put(('report', 'v1', 'a'), 1)
+    cache.put(('report', 'v2', 'a'), 2)
+    assert cache.version == 'v2'
+    assert list(cache.entries) == [('report', 'v2', 'a')]
@@ -0,0 +1,23 @@
+import numpy as np
+
+from trend_stats import DailyStats
+
+
+# A newer series (a corrected day, then new days) gives the same statistics whether
+# they are brought up to date or built from scratch
+def test_updated_matches_fresh_build():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 50, 400).astype(np.float64)
+    newer = np.concatenate([values, rng.integers(0, 50, 30)])
+    newer[350] += 7
+
+    updated = DailyStats(1000, values).updated(newer)
+    fresh = DailyStats(1000, newer)
+    np.testing.assert_allclose(updated.cumsum, fresh.cumsum)
+    np.testing.assert_allclose(updated.ewm, fresh.ewm)
+    np.testing.assert_allclose(updated.rolling_mean(), fresh.rolling_mean())
+
+
+def test_updated_unchanged_series_is_kept():
+    stats = DailyStats(0, np.arange(10))
+    assert stats.updated(np.arange(10)) is stats
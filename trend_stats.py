@@ -0,0 +1,124 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from persian_calendar import SATURDAY
+
+
+# Window of the rolling mean and span of the exponentially weighted mean, in days
+ROLLING_DAYS = 7
+EWMA_SPAN = 14
+
+# Percentiles reported per period
+PERCENTILES = (10, 25, 75, 90)
+
+# Persian week, starting Saturday
+WEEKDAYS = ['Shanbe', 'Yekshanbe', 'Doshanbe', 'Seshanbe', 'Chaharshanbe', 'Panjshanbe', 'Jome']
+
+# Statistics per (source, category, measure), replaced by updated ones as days arrive
+_stats_cache = {}
+_stats_lock = threading.Lock()
+
+
+# Position of every day ordinal in the Persian week (0 = Saturday).
+# date.fromordinal(1) is a Monday, so weekday() == (ordinal - 1) % 7.
+def persian_weekday(ordinals):
+    return ((np.asarray(ordinals) - 1) % 7 - SATURDAY) % 7
+
+
+# Running statistics of a dense daily series (one value per calendar day from
+# first_ordinal). Keeps the cumulative sums and the EWMA of every day, so moving
+# averages are array arithmetic, and a newer series only recomputes the days from the
+# first one that changed. Instances are not modified once built, so sessions can
+# share them.
+class DailyStats:
+    def __init__(self, first_ordinal, values, ewma_span=EWMA_SPAN):
+        self.first_ordinal = int(first_ordinal)
+        self.alpha = 2 / (ewma_span + 1)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.cumsum = np.concatenate([[0.0], np.cumsum(self.values)])
+        self.ewm = self._ewm(self.values)
+
+    def _ewm(self, values, seed=None):
+        if seed is None:
+            return pd.Series(values).ewm(alpha=self.alpha, adjust=False).mean().to_numpy()
+        # Continue the recursion from the last kept value of the average
+        return self._ewm(np.concatenate([[seed], values]))[1:]
+
+    @property
+    def last_ordinal(self):
+        return self.first_ordinal + len(self.values) - 1
+
+    # Statistics of a newer version of the series (same first day). Days before the
+    # first one that differs are kept; cumulative sums and the EWMA continue from there.
+    def updated(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        common = min(len(values), len(self.values))
+        changed = np.flatnonzero(values[:common] != self.values[:common])
+        keep = int(changed[0]) if len(changed) else common
+        if keep == len(values) == len(self.values):
+            return self
+
+        tail = values[keep:]
+        stats = DailyStats.__new__(DailyStats)
+        stats.first_ordinal = self.first_ordinal
+        stats.alpha = self.alpha
+        stats.values = values
+        stats.cumsum = np.concatenate([self.cumsum[:keep + 1], self.cumsum[keep] + np.cumsum(tail)])
+        stats.ewm = np.concatenate([self.ewm[:keep], self._ewm(tail, self.ewm[keep - 1] if keep else None)])
+        return stats
+
+    def positions(self, ordinals):
+        return np.asarray(ordinals, dtype=np.int64) - self.first_ordinal
+
+    # Trailing mean over window days (fewer at the start of the series)
+    def rolling_mean(self, window=ROLLING_DAYS):
+        ends = np.arange(1, len(self.values) + 1)
+        starts = np.maximum(ends - window, 0)
+        return (self.cumsum[ends] - self.cumsum[starts]) / (ends - starts)
+
+    # Total, mean, median and percentiles of every period of a period_ranges table
+    # (periods of equal length), from one gather of the days into a period x day grid
+    def period_stats(self, ranges):
+        starts = self.positions(ranges['Start_Ordinal'].to_numpy())
+        num_days = int(ranges['End_Ordinal'].iat[0] - ranges['Start_Ordinal'].iat[0] + 1)
+        grid_positions = starts[:, None] + np.arange(num_days)
+        inside = (grid_positions >= 0) & (grid_positions < len(self.values))
+        grid = np.where(inside, self.values[np.clip(grid_positions, 0, max(len(self.values) - 1, 0))], 0)
+
+        stats = ranges[['Range_Number', 'Start_Persian', 'End_Persian']].assign(
+            Total=grid.sum(axis=1), Mean=grid.mean(axis=1), Median=np.median(grid, axis=1))
+        percentiles = np.percentile(grid, PERCENTILES, axis=1)
+        for percentile, column in zip(PERCENTILES, percentiles):
+            stats[f'P{percentile}'] = column
+        return stats
+
+    # Mean value per day of the Persian week over [start_ordinal, end_ordinal], and
+    # its ratio to the mean of all days (seasonality index)
+    def weekday_profile(self, start_ordinal=None, end_ordinal=None):
+        start = max(0, self.positions(start_ordinal) if start_ordinal is not None else 0)
+        end = min(len(self.values), self.positions(end_ordinal) + 1 if end_ordinal is not None else len(self.values))
+        end = max(start, end)
+        values = self.values[start:end]
+        weekdays = persian_weekday(np.arange(start, end) + self.first_ordinal)
+        counts = np.bincount(weekdays, minlength=7)
+        means = np.bincount(weekdays, weights=values, minlength=7) / np.maximum(counts, 1)
+        overall = values.mean() if len(values) else 0
+        return pd.DataFrame({'Weekday': WEEKDAYS, 'Days': counts, 'Mean': means,
+                             'Index': means / overall if overall else np.zeros(7)})
+
+
+# Statistics of a source's daily series for a category, cached per source and
+# category and brought up to date incrementally on every call
+def daily_stats(source, category=None, measure='Quantity'):
+    first_ordinal, values = source.daily_values(category, measure)
+    key = (source.key, category, measure)
+    with _stats_lock:
+        stats = _stats_cache.get(key)
+        if stats is None or stats.first_ordinal != first_ordinal:
+            stats = DailyStats(first_ordinal, values)
+        else:
+            stats = stats.updated(values)
+        _stats_cache[key] = stats
+        return stats